@@ -0,0 +1,145 @@
+"""Microbenchmark for cleaning.clean_and_format_scraped_data.
+
+The corpus is the set of pages recorded in scraping_debug_log.txt, which
+are large and highly repetitive, plus synthetic Polish pages with NIP,
+REGON, phone numbers, emails and footer noise. Each case is checked to
+give byte-identical output to the original implementation kept below,
+then both are timed.
+
+    python benchmarks/bench_clean.py --repeat 20
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cleaning import clean_and_format_scraped_data  # noqa: E402
+from fixtures import load_recorded_pages  # noqa: E402
+from registry import nip_is_valid, regon_is_valid  # noqa: E402
+
+
+# The implementation before the rewrite, kept as the correctness reference; the
+# only later change is that invalid NIPs and REGONs are not appended
+def reference_clean_and_format_scraped_data(scraped_data):
+    cleaned_data = {}
+    nip_pattern = r'\bNIP\s*\d{3}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}\b'
+    regon_pattern = r'\bREGON\s*\d{9}\b'
+
+    noisy_patterns = [
+        r'\s+',
+        r'\b(Polityka prywatności|Zastrzeżenia|Wszelkie prawa zastrzeżone|Cookies)\b',
+        r'(?:facebook|twitter|linkedin|instagram)\.com'
+    ]
+
+    repeated_block_patterns = [
+        r'(\+?\d[\d\s\-\(\)]{7,})',
+        r'\S+@\S+',
+    ]
+
+    for url, content in scraped_data.items():
+        content = unicodedata.normalize("NFKD", content)
+        content = re.sub(r'\s+', ' ', content).strip()
+
+        nip_match = next((m for m in re.finditer(nip_pattern, content) if nip_is_valid(m.group(0))), None)
+        regon_match = next((m for m in re.finditer(regon_pattern, content) if regon_is_valid(m.group(0))), None)
+        nip = nip_match.group(0) if nip_match else ""
+        regon = regon_match.group(0) if regon_match else ""
+
+        for pattern in repeated_block_patterns:
+            content = re.sub(pattern, '', content)
+        for pattern in noisy_patterns:
+            content = re.sub(pattern, '', content)
+
+        lines = content.split('. ')
+        seen = set()
+        deduplicated_lines = []
+
+        for line in lines:
+            if line not in seen:
+                seen.add(line)
+                deduplicated_lines.append(line)
+
+        content = '. '.join(deduplicated_lines)
+        content = re.sub(r'\n{2,}', '\n', content)
+
+        if nip:
+            content += f"\nNIP: {nip}"
+        if regon:
+            content += f"\nREGON: {regon}"
+
+        if content:
+            cleaned_data[url] = content
+
+    formatted_data = ""
+    for url, content in cleaned_data.items():
+        formatted_data += f"Source: {url}\nContent:\n{content}\n\n"
+
+    return formatted_data
+
+
+def synthetic_polish_page(rng, paragraphs=200):
+    words = ("firma oferuje produkty usługi dystrybucja producent uszczelki zakład żółć "
+             "gęślą jaźń spółka klienci branża jakość innowacyjność").split()
+    out = []
+    for i in range(paragraphs):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(5, 25)))
+        out.append(sentence.capitalize() + ".")
+        if i % 17 == 0:
+            out.append("Tel. +48 (12) 345-67-89, biuro@example.pl, facebook.com/firma")
+        if i % 29 == 0:
+            out.append("Polityka prywatności\n\tWszelkie prawa zastrzeżone Cookies")
+    out.append("NIP 123-456-32-19 REGON 123456786 NIP 123-456-32-18 REGON 123456785")
+    return "\n\n".join(out)
+
+
+def build_corpus():
+    rng = random.Random(0)
+    recorded = load_recorded_pages()
+    corpus = {
+        "recorded": recorded,
+        # Three copies of the site, the size a big multi-page company reaches
+        "recorded_x3": {f"{url}?copy={i}": text for i in range(3) for url, text in recorded.items()},
+        "synthetic_polish": {f"https://example.pl/{i}": synthetic_polish_page(rng) for i in range(5)},
+        "empty_and_whitespace": {"https://example.pl/a": "", "https://example.pl/b": " \n\t "},
+    }
+    return corpus
+
+
+def time_call(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, pages in build_corpus().items():
+        expected = reference_clean_and_format_scraped_data(pages)
+        actual = clean_and_format_scraped_data(pages)
+        if actual != expected:
+            raise SystemExit(f"{name}: output differs from the reference implementation")
+
+        size = sum(len(text) for text in pages.values())
+        reference_s = time_call(reference_clean_and_format_scraped_data, pages, args.repeat)
+        new_s = time_call(clean_and_format_scraped_data, pages, args.repeat)
+        speedup = reference_s / new_s if new_s else float("inf")
+        print(f"{name:22} {len(pages):3} pages {size / 1024:8.1f} KiB  "
+              f"reference {reference_s * 1000:8.2f} ms  new {new_s * 1000:8.2f} ms  "
+              f"({speedup:.2f}x, {size / new_s / 1e6 if new_s else 0:.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Measure cold-start and per-request setup time of main.py.
+
+Every run imports main in a fresh interpreter, so module import time is a
+real cold start. Then the chain builders are called twice to show the
+first-request setup cost and the (cached) cost on later requests.
+
+    python benchmarks/bench_cold_start.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import main
+import_s = time.perf_counter() - started
+main.get_relevant_links_chain()
+main.generate_description_chain()
+main.get_relevant_links_chain()
+main.generate_description_chain()
+report = main.get_setup_report()
+report["total_import_s"] = import_s
+print(json.dumps(report))
+"""
+
+
+def run_once(startup_mode):
+    env = dict(os.environ, STARTUP_MODE=startup_mode)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for mode in ("lazy", "eager"):
+        reports = [run_once(mode) for _ in range(args.runs)]
+        imports = [r["total_import_s"] for r in reports]
+        print(f"[{mode}] import main: median {statistics.median(imports) * 1000:.1f} ms, max {max(imports) * 1000:.1f} ms")
+        for name in reports[0]["setup"]:
+            first = [r["setup"][name]["first_s"] for r in reports]
+            last = [r["setup"][name]["last_s"] for r in reports]
+            print(f"    {name}: first call {statistics.median(first) * 1000:.1f} ms, "
+                  f"cached call {statistics.median(last) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Offline end-to-end benchmark of the description pipeline.
+
+Recorded company sites (see fixtures.py) are served from a local HTTP
+server and ChatOpenAI is replaced with a deterministic fake chat model
+with configurable latency, so no live site or OpenAI call is made. Rows
+are run through main.process_batch at several concurrency levels and
+the script reports per-stage latency percentiles, throughput, peak
+memory and prompt/completion tokens.
+
+    python benchmarks/bench_pipeline.py --rows 64 --concurrency 1 4 16 --llm-latency 0.8
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Everything must come from the local server and the fake model
+os.environ["PAGE_CACHE_PATH"] = ""
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ["RESULT_STORE_PATH"] = ""
+os.environ["RENDER_JS"] = "0"
+os.environ["FETCH_PER_HOST_CONCURRENCY"] = "256"
+# The fake model has no quota; set LLM_SCHEDULER=1 with OPENAI_RPM/TPM to see its effect
+os.environ.setdefault("LLM_SCHEDULER", "0")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.language_models.chat_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, AIMessageChunk  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult  # noqa: E402
+
+import main  # noqa: E402
+from fixtures import build_site  # noqa: E402
+from tokens import count_tokens  # noqa: E402
+
+STAGES = (
+    "get_all_links",
+    "get_relevant_links",
+    "scrape_data_from_urls",
+    "prepare_description_input",
+    "generate_description",
+    "process_request",
+)
+
+FAKE_DESCRIPTION = (
+    "Spółka jest producentem i dystrybutorem uszczelnień przemysłowych. "
+    "Oferuje uszczelki specjalne, szczeliwa oraz usługi laboratoryjne dla przemysłu. "
+) * 20
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for ChatOpenAI with a fixed latency per call."""
+
+    latency_s: float = 0.5
+    stream_chunk_s: float = 0.0
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-benchmark"
+
+    def _respond(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        if "Linki (ponumerowane):" in prompt:
+            links_part = prompt.split("Linki (ponumerowane):", 1)[1].split("# Odpowiedź", 1)[0]
+            urls = re.findall(r"https?://\S+", links_part)
+            preferred = [u for u in urls if re.search(r"about|products|laboratory", u)] + urls
+            chosen = list(dict.fromkeys(preferred))[:3]
+            answer = json.dumps({"links": [urls.index(u) + 1 for u in chosen]})
+        elif "# Fragment" in prompt:
+            answer = prompt.split("# Fragment", 1)[1][:800]
+        else:
+            answer = FAKE_DESCRIPTION
+        self.calls += 1
+        self.prompt_tokens += count_tokens(prompt, main.MODEL_NAME)
+        self.completion_tokens += count_tokens(answer, main.MODEL_NAME)
+        return answer
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_s)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_s)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_s)
+        for word in re.findall(r"\S+\s*", self._respond(messages)):
+            await asyncio.sleep(self.stream_chunk_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def serve_sites(sites):
+    """Serve {path: html} on 127.0.0.1, returns (server, base_url)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = sites.get(self.path.split("?", 1)[0].split("#", 1)[0])
+            if body is None:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def instrument_stages(timings):
+    """Wrap the pipeline stages in main so every call's wall time is recorded."""
+    for name in STAGES:
+        original = getattr(main, name)
+
+        async def timed(*args, _original=original, _name=name, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await _original(*args, **kwargs)
+            finally:
+                timings[_name].append(time.perf_counter() - started)
+
+        setattr(main, name, timed)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=32)
+    parser.add_argument("--sites", type=int, default=8, help="distinct copies of the recorded site")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--heuristic-skip", action="store_true", help="let the link ranker skip the LLM call")
+    args = parser.parse_args()
+
+    main.LINK_RANKER_SKIP_LLM = args.heuristic_skip
+
+    sites = {}
+    for i in range(args.sites):
+        sites.update(build_site(prefix=f"/c{i}"))
+    server, base_url = serve_sites(sites)
+
+    timings = {name: [] for name in STAGES}
+    instrument_stages(timings)
+
+    try:
+        for concurrency in args.concurrency:
+            for values in timings.values():
+                values.clear()
+            model = FakeChatModel(latency_s=args.llm_latency)
+            main.use_llm(model)
+
+            rows = [{"row": i, "strona_www": f"{base_url}/c{i % args.sites}/"} for i in range(args.rows)]
+            started = time.perf_counter()
+            result = asyncio.run(main.process_batch(rows, concurrency))
+            elapsed = time.perf_counter() - started
+
+            max_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"\nconcurrency {concurrency}: {args.rows} rows in {elapsed:.2f} s, "
+                  f"{args.rows / elapsed:.2f} rows/s, {result['failed']} failed, peak RSS {max_rss_mib:.0f} MiB")
+            print(f"  LLM calls {model.calls}, prompt tokens {model.prompt_tokens}, "
+                  f"completion tokens {model.completion_tokens} "
+                  f"({model.prompt_tokens / args.rows:.0f} / {model.completion_tokens / args.rows:.0f} per row)")
+            for name in STAGES:
+                values = timings[name]
+                if not values:
+                    continue
+                print(f"  {name:27} n={len(values):4}  p50 {percentile(values, 50) * 1000:8.1f} ms  "
+                      f"p95 {percentile(values, 95) * 1000:8.1f} ms  p99 {percentile(values, 99) * 1000:8.1f} ms  "
+                      f"mean {statistics.mean(values) * 1000:8.1f} ms")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main_benchmark()
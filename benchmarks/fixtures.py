@@ -0,0 +1,65 @@
+"""Recorded company sites used by the benchmarks.
+
+scraping_debug_log.txt holds the text of every page scraped from
+spetech.com.pl. load_recorded_pages() returns it as {url: text} and
+build_site() turns it back into a small static site (homepage with a nav
+bar plus one HTML page per recorded URL) that the pipeline benchmark
+serves from a local HTTP server.
+"""
+import html
+import os
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_PATH = os.path.join(ROOT, "scraping_debug_log.txt")
+
+
+def load_recorded_pages(path=LOG_PATH):
+    """Split the debug log into {url: text} using its 'Content scraped from' markers."""
+    pages = {}
+    url = None
+    lines = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Content scraped from "):
+                if url:
+                    pages[url] = "".join(lines)
+                url = line[len("Content scraped from "):].strip().rstrip(":")
+                lines = []
+            elif line.startswith("Scraping URL: "):
+                if url:
+                    pages[url] = "".join(lines)
+                url = None
+            elif url:
+                lines.append(line)
+    if url:
+        pages[url] = "".join(lines)
+    return pages
+
+
+def _page(title, nav, body_lines):
+    paragraphs = "\n".join(f"<p>{html.escape(line.strip())}</p>" for line in body_lines if line.strip())
+    return (
+        f"<!doctype html><html><head><title>{html.escape(title)}</title>"
+        f"<style>body {{ font-family: sans-serif; }}</style></head>"
+        f"<body><header><nav>{nav}</nav></header><main>{paragraphs}</main>"
+        f"<footer><p>Polityka prywatności</p><p>Cookies</p></footer></body></html>"
+    )
+
+
+def build_site(prefix="", pages=None):
+    """Return {path: html} for a recorded site, every path under `prefix`."""
+    pages = pages if pages is not None else load_recorded_pages()
+    paths = {}
+    for url in pages:
+        path = urlsplit(url).path or "/"
+        paths[url] = prefix + (path if path.startswith("/") else "/" + path)
+
+    nav = "".join(
+        f'<a href="{html.escape(path)}">{html.escape(path.rsplit("/", 1)[-1] or "home")}</a>'
+        for path in paths.values()
+    )
+    site = {prefix + "/": _page("Home", nav, ["Welcome to our company website."])}
+    for url, text in pages.items():
+        site[paths[url]] = _page(url, nav, text.splitlines())
+    return site
@@ -0,0 +1,85 @@
+import math
+import os
+import re
+from collections import Counter
+
+
+# A block shared by at least this share of a company's pages (and at least
+# BOILERPLATE_MIN_PAGES of them) is treated as site template
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "2"))
+BOILERPLATE_MIN_RATIO = float(os.getenv("BOILERPLATE_MIN_RATIO", "0.5"))
+# Share of a block's shingles that must be template for the whole block to go
+BOILERPLATE_SHINGLE_OVERLAP = float(os.getenv("BOILERPLATE_SHINGLE_OVERLAP", "0.8"))
+SHINGLE_SIZE = 5
+
+_whitespace_pattern = re.compile(r'\s+')
+_word_pattern = re.compile(r'\w+')
+
+
+def _split_blocks(text):
+    # get_text() puts every block level element on its own line
+    blocks = []
+    for line in text.split('\n'):
+        line = _whitespace_pattern.sub(' ', line).strip()
+        if line:
+            blocks.append(line)
+    return blocks
+
+
+def _shingles(block):
+    words = _word_pattern.findall(block.lower())
+    if len(words) < SHINGLE_SIZE:
+        return set()
+    return {hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def remove_boilerplate(pages, min_pages=BOILERPLATE_MIN_PAGES, min_ratio=BOILERPLATE_MIN_RATIO,
+                       overlap=BOILERPLATE_SHINGLE_OVERLAP):
+    """Strip blocks shared across a company's pages (menus, headers, footers).
+
+    `pages` is the {url: text} dict from scrape_data_from_urls. Blocks are
+    fingerprinted exactly and by word shingles, so a menu with one extra
+    item still counts as shared. Repeated blocks within a page are dropped
+    too. Returns a new {url: text} dict.
+    """
+    page_blocks = {url: _split_blocks(text) for url, text in pages.items()}
+
+    # Document frequency of every block and every shingle, counted once per page
+    block_freq = Counter()
+    shingle_freq = Counter()
+    block_shingles = {}
+    for blocks in page_blocks.values():
+        unique_blocks = set(blocks)
+        block_freq.update(hash(block.lower()) for block in unique_blocks)
+        page_shingles = set()
+        for block in unique_blocks:
+            if block not in block_shingles:
+                block_shingles[block] = _shingles(block)
+            page_shingles |= block_shingles[block]
+        shingle_freq.update(page_shingles)
+
+    threshold = max(min_pages, math.ceil(min_ratio * len(pages)))
+    site_level = len(pages) >= min_pages
+
+    def is_template(block):
+        if not site_level:
+            return False
+        if block_freq[hash(block.lower())] >= threshold:
+            return True
+        shingles = block_shingles[block]
+        if not shingles:
+            return False
+        shared = sum(1 for s in shingles if shingle_freq[s] >= threshold)
+        return shared / len(shingles) >= overlap
+
+    result = {}
+    for url, blocks in page_blocks.items():
+        seen = set()
+        kept = []
+        for block in blocks:
+            if block in seen or is_template(block):
+                continue
+            seen.add(block)
+            kept.append(block)
+        result[url] = '\n'.join(kept)
+    return result
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import weakref
+
+
+# Headless rendering settings, RENDER_JS=0 turns the browser path off
+RENDER_JS = os.getenv("RENDER_JS", "1") == "1"
+BROWSER_CONTEXTS = int(os.getenv("BROWSER_CONTEXTS", "3"))
+RENDER_TIMEOUT_MS = int(os.getenv("RENDER_TIMEOUT_MS", "20000"))
+# Longest wait for a free context before falling back to the static HTML
+RENDER_QUEUE_TIMEOUT = float(os.getenv("RENDER_QUEUE_TIMEOUT", "60"))
+
+# Resource types never needed to read the text of a page
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+
+class BrowserPool:
+    """One long-lived Chromium with a fixed set of reusable contexts.
+
+    Pages are rendered in whichever context is free, so at most
+    BROWSER_CONTEXTS pages render at the same time. A crashed browser is
+    relaunched with fresh contexts on the next render.
+    """
+
+    def __init__(self, size=BROWSER_CONTEXTS):
+        self.size = size
+        self.stats = {"rendered": 0, "failed": 0}
+        self._playwright = None
+        self._browser = None
+        self._contexts = asyncio.Queue()
+        self._generation = 0
+        self._start_lock = asyncio.Lock()
+
+    async def _start(self):
+        global _launch_failed
+        async with self._start_lock:
+            if _launch_failed:
+                raise RuntimeError("the browser could not be launched earlier")
+            if self._browser is not None:
+                if self._browser.is_connected():
+                    return
+                logging.warning("Browser disconnected, relaunching it")
+                await self._discard()
+            from playwright.async_api import async_playwright
+
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            try:
+                self._browser = await self._playwright.chromium.launch()
+            except Exception as e:
+                # No browser binary (the usual Cloud Functions deploy): stop trying for this process
+                logging.warning(f"Browser launch failed, JS rendering is disabled: {e!r}")
+                _launch_failed = True
+                await self.close()
+                raise
+            self._generation += 1
+            for _ in range(self.size):
+                context = await self._browser.new_context()
+                await context.route("**/*", _block_heavy_resources)
+                self._contexts.put_nowait(context)
+
+    async def render(self, url):
+        """Return the HTML of a page after its scripts ran."""
+        await self._start()
+        context = await asyncio.wait_for(self._contexts.get(), RENDER_QUEUE_TIMEOUT)
+        generation = self._generation
+        page = None
+        try:
+            page = await context.new_page()
+            await page.goto(url, wait_until="networkidle", timeout=RENDER_TIMEOUT_MS)
+            content = await page.content()
+            self.stats["rendered"] += 1
+            return content
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            if page is not None:
+                try:
+                    await page.close()
+                except Exception as e:
+                    logging.debug(f"Closing the page of {url} failed: {e!r}")
+            # Contexts of a browser that was relaunched meanwhile are not reused
+            if generation == self._generation:
+                self._contexts.put_nowait(context)
+
+    async def _discard(self):
+        """Forget the current browser and its contexts."""
+        while not self._contexts.empty():
+            self._contexts.get_nowait()
+        self._generation += 1
+        browser, self._browser = self._browser, None
+        try:
+            await browser.close()
+        except Exception as e:
+            logging.debug(f"Closing the disconnected browser failed: {e!r}")
+
+    async def close(self):
+        if self._browser is not None:
+            await self._discard()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+async def _block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+# One browser per event loop, like the fetcher
+_pools = weakref.WeakKeyDictionary()
+_playwright_missing = False
+_launch_failed = False
+
+
+def get_browser_pool():
+    """Return the browser pool of the running loop, or None when rendering is off."""
+    global _playwright_missing
+    if not RENDER_JS or _playwright_missing or _launch_failed:
+        return None
+    try:
+        import playwright.async_api  # noqa: F401
+    except ImportError:
+        logging.warning("playwright is not installed, JS rendering is disabled")
+        _playwright_missing = True
+        return None
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = BrowserPool()
+        _pools[loop] = pool
+    return pool
@@ -0,0 +1,210 @@
+"""Resumable bulk runner: JSONL rows in, JSONL descriptions out.
+
+Input rows have the same shape as a hello_http batch row
+({"row", "strona_www", "regon"}). The input is streamed, so at most
+--concurrency rows are in memory at a time. Every finished row is appended
+to the output right away. Text extraction and cleaning run in a process
+pool so they do not compete with the event loop.
+
+Successful rows go to OUTPUT and failed rows to <OUTPUT stem>.errors.jsonl. Each
+record carries the input line number ("line"), and those line numbers are
+the checkpoint. Re-running the same command skips every line already in
+OUTPUT, so only failed or unfinished rows are redone after a crash, a
+Ctrl-C or a stop caused by repeated errors (e.g. OpenAI rate limits).
+
+    python bulk.py companies.jsonl descriptions.jsonl --concurrency 16 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+from browser_pool import get_browser_pool
+from fetcher import get_fetcher
+from sheets import get_sheets_writer
+
+
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "16"))
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", str(os.cpu_count() or 1)))
+# Stop after this many failed rows in a row, usually rate limiting or an outage
+BULK_MAX_CONSECUTIVE_FAILURES = int(os.getenv("BULK_MAX_CONSECUTIVE_FAILURES", "25"))
+# Progress is logged every this many finished rows
+PROGRESS_EVERY = 100
+
+
+def read_rows(path):
+    """Yield (line number, row) for each JSON object in the input, skipping blank lines."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.warning(f"Skipping invalid JSON on line {line_number}: {e}")
+
+
+def load_checkpoint(path):
+    """Return the input line numbers already written to `path`.
+
+    A torn last record (the process died mid-write) is cut off, so appending
+    starts on a clean line.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    valid_size = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            try:
+                done.add(json.loads(raw)["line"])
+            except (ValueError, KeyError, TypeError):
+                break
+            valid_size += len(raw)
+    if valid_size < os.path.getsize(path):
+        logging.warning(f"Truncating incomplete record at the end of {path}")
+        with open(path, "r+b") as f:
+            f.truncate(valid_size)
+    return done
+
+
+class BulkRunner:
+    def __init__(self, output_path, concurrency, report_metadata=False,
+                 max_consecutive_failures=BULK_MAX_CONSECUTIVE_FAILURES, force_refresh=False):
+        self.output_path = output_path
+        self.errors_path = os.path.splitext(output_path)[0] + ".errors.jsonl"
+        self.concurrency = max(1, concurrency)
+        self.report_metadata = report_metadata
+        self.force_refresh = force_refresh
+        self.max_consecutive_failures = max_consecutive_failures
+        self.stats = {"skipped": 0, "succeeded": 0, "failed": 0}
+        self.consecutive_failures = 0
+        self.stopping = asyncio.Event()
+        self.started = time.perf_counter()
+
+    def stop(self, reason):
+        if not self.stopping.is_set():
+            logging.warning(f"Stopping: {reason}; finishing rows in flight")
+            self.stopping.set()
+
+    async def run(self, input_path):
+        done = load_checkpoint(self.output_path)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        in_flight = set()
+
+        with open(self.output_path, "a", encoding="utf-8") as out, \
+                open(self.errors_path, "a", encoding="utf-8") as errors:
+
+            async def run_row(line_number, row_json):
+                try:
+                    result = await main.process_row(
+                        line_number, row_json, self.report_metadata, self.force_refresh
+                    )
+                    self.write(out if "error" not in result else errors, {"line": line_number, **result})
+                finally:
+                    semaphore.release()
+
+            for line_number, row_json in read_rows(input_path):
+                if line_number in done:
+                    self.stats["skipped"] += 1
+                    continue
+                # Read the next row only once a slot is free, so memory stays flat
+                await semaphore.acquire()
+                if self.stopping.is_set():
+                    semaphore.release()
+                    break
+                task = asyncio.create_task(run_row(line_number, row_json))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            if in_flight:
+                await asyncio.gather(*in_flight)
+
+        self.log_progress()
+        return self.stats
+
+    def write(self, f, record):
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+
+        if "error" in record:
+            self.stats["failed"] += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.max_consecutive_failures:
+                self.stop(f"{self.consecutive_failures} rows failed in a row, last: {record['error']}")
+        else:
+            self.stats["succeeded"] += 1
+            self.consecutive_failures = 0
+
+        if (self.stats["succeeded"] + self.stats["failed"]) % PROGRESS_EVERY == 0:
+            self.log_progress()
+
+    def log_progress(self):
+        finished = self.stats["succeeded"] + self.stats["failed"]
+        elapsed = time.perf_counter() - self.started
+        logging.info(
+            f"{finished} rows in {elapsed:.0f} s ({finished / elapsed if elapsed else 0:.2f} rows/s), "
+            f"{self.stats['succeeded']} succeeded, {self.stats['failed']} failed, "
+            f"{self.stats['skipped']} skipped from checkpoint"
+        )
+
+
+async def run_bulk(args):
+    runner = BulkRunner(
+        args.output, args.concurrency, args.report_metadata, args.max_consecutive_failures, args.force_refresh
+    )
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, runner.stop, signal.Signals(signum).name)
+    try:
+        return runner, await runner.run(args.input)
+    finally:
+        writer = get_sheets_writer()
+        if writer is not None:
+            await writer.aclose()
+        await get_fetcher().aclose()
+        pool = get_browser_pool()
+        if pool is not None:
+            await pool.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of rows with strona_www")
+    parser.add_argument("output", help="JSONL file results are appended to, also the checkpoint")
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY, help="rows processed at the same time")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS,
+                        help="processes for extraction and cleaning, 0 keeps them in threads")
+    parser.add_argument("--max-consecutive-failures", type=int, default=BULK_MAX_CONSECUTIVE_FAILURES)
+    parser.add_argument("--report-metadata", action="store_true", help="keep per-row pipeline metadata")
+    parser.add_argument("--force-refresh", action="store_true",
+                        help="regenerate descriptions even when the site did not change")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    # Spawn rather than fork, the parent already runs threads
+    executor = None
+    if args.workers > 0:
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    main.use_cpu_executor(executor)
+    try:
+        runner, _ = asyncio.run(run_bulk(args))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    # Non-zero when stopped early, so a wrapper script knows to resume later
+    sys.exit(1 if runner.stopping.is_set() else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
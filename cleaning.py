@@ -0,0 +1,87 @@
+import re
+import unicodedata
+
+from registry import nip_is_valid, regon_is_valid
+
+
+# Patterns are compiled once per process instead of on every page
+nip_pattern = re.compile(r'\bNIP\s*\d{3}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}\b')
+regon_pattern = re.compile(r'\bREGON\s*\d{9}\b')
+phone_pattern = re.compile(r'(\+?\d[\d\s\-\(\)]{7,})')
+# Footer/legal terms and social media links, removed in a single pass
+noise_pattern = re.compile(
+    r'\b(?:Polityka prywatności|Zastrzeżenia|Wszelkie prawa zastrzeżone|Cookies)\b'
+    r'|(?:facebook|twitter|linkedin|instagram)\.com'
+)
+# Literals one of which must be present for noise_pattern to match
+noise_literals = (
+    'Polityka prywatności', 'Zastrzeżenia', 'Wszelkie prawa zastrzeżone', 'Cookies',
+    'facebook.com', 'twitter.com', 'linkedin.com', 'instagram.com',
+)
+
+
+def _first_valid(pattern, content, is_valid):
+    """First match of pattern whose number passes its check digit, or None."""
+    for match in pattern.finditer(content):
+        if is_valid(match.group(0)):
+            return match
+    return None
+
+
+def clean_page(content):
+    """Clean the text of a single page. Returns "" when nothing is left.
+
+    Gives the same output as the original eight-pass version, see
+    benchmarks/bench_clean.py which checks it against that version, except
+    that only a NIP/REGON with a valid check digit is appended.
+    """
+    content = unicodedata.normalize("NFKD", content)
+    # Same as re.sub(r'\s+', ' ', content).strip(): str.split() and \s
+    # use the same definition of whitespace
+    content = ' '.join(content.split())
+
+    # Typos and unrelated numbers after "NIP"/"REGON" would end up in the description
+    nip_match = _first_valid(nip_pattern, content, nip_is_valid) if 'NIP' in content else None
+    regon_match = _first_valid(regon_pattern, content, regon_is_valid) if 'REGON' in content else None
+
+    # Phone numbers can span spaces, so they are removed from the spaced text
+    content = phone_pattern.sub('', content)
+
+    # The only whitespace left is ' '. r'\S+@\S+' removes a whole word when
+    # it has an '@' with at least one character on each side, and the old
+    # r'\s+' -> '' pass removes the spaces, so both are done in one join.
+    # With no spaces left the old '. ' sentence dedup and '\n{2,}' collapse
+    # never matched anything, so they are gone.
+    if '@' in content:
+        content = ''.join(word for word in content.split(' ') if '@' not in word[1:-1])
+    else:
+        content = content.replace(' ', '')
+
+    # Neither noise alternative can create or overlap a match of the other,
+    # so one pass gives the same result as the old two
+    if any(literal in content for literal in noise_literals):
+        content = noise_pattern.sub('', content)
+
+    if nip_match:
+        content += f"\nNIP: {nip_match.group(0)}"
+    if regon_match:
+        content += f"\nREGON: {regon_match.group(0)}"
+    return content
+
+
+def clean_scraped_data(scraped_data):
+    """Clean every page of {url: text}, dropping pages left empty."""
+    cleaned_data = {}
+    for url, content in scraped_data.items():
+        content = clean_page(content)
+        if content:
+            cleaned_data[url] = content
+    return cleaned_data
+
+
+def format_cleaned_data(cleaned_data):
+    return ''.join(f"Source: {url}\nContent:\n{content}\n\n" for url, content in cleaned_data.items())
+
+
+def clean_and_format_scraped_data(scraped_data):
+    return format_cleaned_data(clean_scraped_data(scraped_data))
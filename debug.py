@@ -11,8 +11,10 @@ from urllib.parse import urljoin
 from urllib.parse import urljoin
 import re
 import json
-from output_parsers import relevant_links_parser
+from output_parsers import relevant_links_parser, format_numbered_links, links_from_numbers
+from prompts import GET_RELEVANT_LINKS_TEMPLATE
 import unicodedata
+from metrics import log_payload
 
 # Load environment variables
 load_dotenv()
@@ -153,37 +155,10 @@ def clean_and_format_scraped_data(scraped_data):
 async def get_relevant_links(urls):
     logging.info(f"Calling OpenAI API with URLs: {urls}")
 
-    get_relevant_links_template = """
-    # Kontekst
-    Jeteś asystentem którego zadaniem jest jak najlepsze oznaczenie linków ze strony firmy pod kątem istotności znajdujących się informacji pod tymi linkami w kontekście stworzenia opisu firmy.
-    # Zadanie
-    Na podstawie podanych linków, oznacz te, pod którymi, z największym prawdopodobieństwem znajdują się istotne informacje do stworzenia opisu firmy.
-    Aby lepiej oznaczyć linki przeanalizuj kryteria opisu firmy, które będą używanie do stworzenia takiego opisu.
-    # Kryteria opisu
-    - Opis powinien być zwięzły, więc nie jest konieczne oznaczanie wszystkich linków, a jedynie te, które zawierają najważniejsze informacje.
-    - Opis powinien zawierać informacje o firmie, takie jak:
-        - Co firma oferuje, czy sprzedaje produkty, czy usługi, czy jest dystrybutorem?
-        - W jakiej branży działa firma?
-    # Podsumowanie
-    Głównie zwracaj uwagę na zakładki typu 'o nas', 'produkty, 'usługi', 'kontakt'
-    Unikaj oznaczania linków do blogów, artykułów, publikacji, itp.
-    Oznacz link 'YES' jeśli zawiera on informacje istotne, a 'NO' jeśli nie zawiera.
-    Oznaczone przez Ciebie linki będą programistycznie scrapowane, a ich zawartość będzie użyta do stworzenia opisu firmy. Dlatego ważne jest abyś zawsze oznaczał linki zgodnie z kryteriami, i wielkością liter 'YES' lub 'NO'.
-    Linki: {urls}
-    # Odpowiedź
-    W odpowiedzi nie pomijaj żadnego linku. 
-    Liczba linków i linki powinny zgadzać się z podanymi. Dodaj jedynie oznaczenia 'YES' lub 'NO' dla każdego linku.
-    Maksymalnie oznacz 3 najistotniejsze linki, ponieważ są one scrapowane i naszym celem jest uniknięcie zbyt dużej ilości niepotrzebnych informacji.
-    NIE możesz oznaczyć więcej niż 3 linki jako 'YES'. Wybierz naistotniejsze pod względem kryteriów.
-    Nie dodawaj żadnych dodatkowych informacji, podaj JEDYNIE listę linków.
-    Teraz przeanalizuj podane informacje i oznacz linki jako 'YES' lub 'NO'.
-    \n{format_instructions}
-    """
-    
     # Define the prompt template
     get_relevant_links_prompt_template = PromptTemplate(
         input_variables=["urls"],
-        template=get_relevant_links_template,
+        template=GET_RELEVANT_LINKS_TEMPLATE,
         partial_variables={
             "format_instructions": relevant_links_parser.get_format_instructions()
         },
@@ -195,16 +170,17 @@ async def get_relevant_links(urls):
     # Combine the prompt and the LLM chain
     chain = get_relevant_links_prompt_template | llm | relevant_links_parser
 
-    res = chain.invoke(input={"urls": urls})
+    res = chain.invoke(input={"urls": format_numbered_links(urls)})
 
     # Log the openai response
-    logging.info(f"OpenAI response: {res}")
+    log_payload("OpenAI response", res)
     
     return res
 
 # Function to call OpenAI API to generate a description
 async def generate_description(cleaned_data):
-    logging.info(f"Calling OpenAI API to generate description with data: {cleaned_data}")
+    logging.info("Calling OpenAI API to generate description")
+    log_payload("Description input", cleaned_data)
 
     generate_description_template = """
     # Kontekst
@@ -253,7 +229,7 @@ async def generate_description(cleaned_data):
     llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
     chain = generate_description_prompt_template | llm
     res_descripion = chain.invoke(input={"cleaned_data": cleaned_data})
-    logging.info(f"OpenAI response: {res_descripion}")
+    log_payload("OpenAI response", res_descripion)
     return res_descripion
 
 # Function to scrape data from relevant URLs
@@ -265,17 +241,12 @@ async def scrape_data_from_urls(page, yes_urls):
         content = await page.content()
         soup = BeautifulSoup(content, 'html.parser')
         data[url] = soup.get_text()
-    logging.info(f"Scraped data: {data}")
+    log_payload("Scraped data", data)
     return data
 
-def filter_relevant_links(links_output):
-    # Access the 'links' dictionary within the RelevantLinksOutput object
-    links_dict = links_output.links
-    
-    # Filter links that are marked as 'YES'
-    relevant_links = {url for url, relevance in links_dict.items() if relevance == 'YES'}
-    
-    return relevant_links
+def filter_relevant_links(links_output, urls):
+    # Map the link numbers chosen by the model back to urls
+    return set(links_from_numbers(links_output, urls))
 
 
 
@@ -298,28 +269,29 @@ async def main():
         print("All links:", all_links)
 
         # Step 3: Get relevant links
-        relevant_links = await get_relevant_links(list(all_links))
+        link_list = list(all_links)
+        relevant_links = await get_relevant_links(link_list)
         logging.info(f"Relevant links: {relevant_links}")
         print("Relevant links:", relevant_links)
 
-        # Step 4: Filter URLs that have been marked as 'YES'
-        yes_urls = filter_relevant_links(relevant_links)
+        # Step 4: Map the chosen link numbers back to URLs
+        yes_urls = filter_relevant_links(relevant_links, link_list)
         logging.info(f"Relevant URLs to scrape: {yes_urls}")
         print("Relevant URLs to scrape:", yes_urls)
 
         # Step 5: Scrape data from relevant URLs
         scraped_data = await scrape_data_from_urls(page, yes_urls)
-        logging.info(f"Scraped data: {scraped_data}")
+        log_payload("Scraped data", scraped_data)
         print("Scraped data:", scraped_data)
 
         # Step 6: Clean scraped data before generating description
         cleaned_data = clean_and_format_scraped_data(scraped_data)
-        logging.info(f"Cleaned data: {cleaned_data}")
+        log_payload("Cleaned data", cleaned_data)
         print("Cleaned data:", cleaned_data )
 
         # Step 6: Generate description
         description = await generate_description(cleaned_data)
-        logging.info(f"Generated description: {description}")
+        log_payload("Generated description", description)
         print("Generated description:", description)
 
         await browser.close()
@@ -0,0 +1,167 @@
+"""robots.txt and sitemap based link discovery.
+
+A site's sitemap lists its real pages in one small request, including
+pages behind JavaScript menus that static homepage parsing never sees.
+discover_sitemap_links() reads robots.txt (honouring its Crawl-delay for
+the host and its Disallow rules for our user agent), follows the sitemaps
+it names (or /sitemap.xml), expands sitemap indexes and returns the
+canonical same-site page URLs. Sitemaps are parsed incrementally and
+reading stops once SITEMAP_MAX_URLS entries were collected.
+"""
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+import zlib
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from fetcher import MAX_BYTES, USER_AGENT, get_fetcher
+from url_utils import canonicalize_url, is_same_site, page_key
+
+
+# DISCOVERY_SITEMAPS=0 turns the sitemap path off
+DISCOVERY_SITEMAPS = os.getenv("DISCOVERY_SITEMAPS", "1") == "1"
+# Page URLs taken from a site's sitemaps, and sitemap files read per site
+SITEMAP_MAX_URLS = int(os.getenv("SITEMAP_MAX_URLS", "500"))
+SITEMAP_MAX_FILES = int(os.getenv("SITEMAP_MAX_FILES", "5"))
+# Gzipped sitemaps are read up to this many decompressed bytes, so a small file cannot expand without bound
+SITEMAP_MAX_DECOMPRESSED = int(os.getenv("SITEMAP_MAX_DECOMPRESSED", str(8 * MAX_BYTES)))
+# Crawl-delay values above this are capped, so one site cannot stall a row for minutes
+ROBOTS_MAX_CRAWL_DELAY = float(os.getenv("ROBOTS_MAX_CRAWL_DELAY", "10"))
+# With at least this many sitemap pages the homepage is not rendered just to find its menu
+SITEMAP_MIN_URLS = int(os.getenv("SITEMAP_MIN_URLS", "5"))
+# Seconds link discovery waits for robots.txt and sitemaps, then goes on with what was found
+DISCOVERY_TIMEOUT = float(os.getenv("DISCOVERY_TIMEOUT", "5"))
+
+SITEMAP_TYPES = ("application/xml", "text/xml", "application/gzip", "application/x-gzip", "text/plain")
+ROBOTS_TYPES = ("text/plain", "text/html")
+# Sitemap files of posts, tags and authors hold no company pages
+_skipped_sitemap_pattern = re.compile(r'post|news|blog|aktualnosci|tag|categor|author|archive', re.IGNORECASE)
+# Same filter as for homepage links
+_skipped_url_pattern = re.compile(r'blog|publications', re.IGNORECASE)
+_feed_chunk_size = 64 * 1024
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _sitemap_chunks(content, max_decompressed=SITEMAP_MAX_DECOMPRESSED):
+    """Yield the sitemap body in chunks, gunzipping it at most max_decompressed bytes far."""
+    if content[:2] != b"\x1f\x8b":
+        for start in range(0, len(content), _feed_chunk_size):
+            yield content[start:start + _feed_chunk_size]
+        return
+    decompress = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    remaining = max_decompressed
+    pending = content
+    while remaining > 0 and not decompress.eof:
+        # max_length bounds every step; the input it did not get to stays in unconsumed_tail
+        chunk = decompress.decompress(pending, min(_feed_chunk_size, remaining))
+        pending = decompress.unconsumed_tail
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+    if remaining <= 0:
+        logging.debug(f"Sitemap decompressed past {max_decompressed} bytes, the rest is ignored")
+
+
+def parse_sitemap(content, max_urls=SITEMAP_MAX_URLS, max_decompressed=SITEMAP_MAX_DECOMPRESSED):
+    """Parse a (possibly gzipped) sitemap or sitemap index incrementally.
+
+    Returns (page urls, child sitemap urls); stops after max_urls page urls
+    or max_decompressed bytes of a gzipped sitemap.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    pages, sitemaps = [], []
+    path = []
+    try:
+        for chunk in _sitemap_chunks(content, max_decompressed):
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                name = _local_name(element.tag)
+                if event == "start":
+                    path.append(name)
+                    continue
+                path.pop()
+                # Only <url><loc> and <sitemap><loc>, not e.g. <image:loc> nested deeper
+                if name == "loc" and element.text and path and path[-1] in ("url", "sitemap"):
+                    (pages if path[-1] == "url" else sitemaps).append(element.text.strip())
+                elif name in ("url", "sitemap"):
+                    # Finished entries are dropped so memory stays flat
+                    element.clear()
+            if len(pages) >= max_urls:
+                break
+    except (ET.ParseError, zlib.error) as e:
+        logging.debug(f"Sitemap parsing stopped: {e}")
+    return pages[:max_urls], sitemaps
+
+
+async def fetch_robots(url):
+    """Return the parsed robots.txt of the url's site, or None when there is none."""
+    robots_url = urljoin(url, "/robots.txt")
+    try:
+        response = await get_fetcher().fetch(robots_url, content_types=ROBOTS_TYPES)
+    except Exception as e:
+        logging.debug(f"No robots.txt for {url}: {e!r}")
+        return None
+    if response.status_code != 200 or not response.content:
+        return None
+    robots = RobotFileParser(robots_url)
+    robots.parse(response.content.decode("utf-8", "ignore").splitlines())
+    return robots
+
+
+async def discover_sitemap_links(url, robots=None, max_urls=SITEMAP_MAX_URLS, discovered=None):
+    """Return canonical same-site page urls listed in the site's sitemaps.
+
+    `discovered` ({page key: url}) is filled as each sitemap is read, so a
+    caller that cancels discovery keeps the urls found until then.
+    """
+    fetcher = get_fetcher()
+    if robots is None:
+        robots = await fetch_robots(url)
+
+    if robots is not None:
+        delay = robots.crawl_delay(USER_AGENT)
+        if delay:
+            fetcher.set_crawl_delay(url, min(float(delay), ROBOTS_MAX_CRAWL_DELAY))
+
+    queue = list((robots.site_maps() if robots is not None else None) or [urljoin(url, "/sitemap.xml")])
+    seen_sitemaps = set()
+    discovered = {} if discovered is None else discovered
+    read = 0
+    while queue and len(seen_sitemaps) < SITEMAP_MAX_FILES and read < max_urls:
+        sitemap_url = queue.pop(0)
+        if sitemap_url in seen_sitemaps:
+            continue
+        seen_sitemaps.add(sitemap_url)
+        try:
+            response = await fetcher.fetch(sitemap_url, content_types=SITEMAP_TYPES)
+        except Exception as e:
+            logging.debug(f"Failed to fetch sitemap {sitemap_url}: {e!r}")
+            continue
+        if response.status_code != 200 or not response.content:
+            continue
+        pages, children = parse_sitemap(response.content, max_urls - read)
+        read += len(pages)
+        _add_pages(discovered, pages, url, robots)
+        # Page sitemaps first, post/tag/author sitemaps never
+        children = [child for child in children if not _skipped_sitemap_pattern.search(urlsplit(child).path)]
+        queue.extend(sorted(children, key=lambda child: "page" not in child.lower()))
+
+    return list(discovered.values())
+
+
+def _add_pages(discovered, links, url, robots):
+    for link in links:
+        try:
+            if not is_same_site(link, url) or _skipped_url_pattern.search(link):
+                continue
+            if robots is not None and not robots.can_fetch(USER_AGENT, link):
+                continue
+            discovered.setdefault(page_key(link), canonicalize_url(link))
+        except ValueError:
+            logging.debug(f"Skipping malformed sitemap url {link!r}")
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import random
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+import metrics
+from page_cache import get_page_cache
+
+
+# Fetch settings, overridable from the environment
+CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "15"))
+MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "100"))
+PER_HOST_CONCURRENCY = int(os.getenv("FETCH_PER_HOST_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", "0.5"))
+# Bodies are cut off after this many (decompressed) bytes
+MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# Content types read by default, anything else (PDFs, images, archives) is skipped unread
+HTML_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# Status codes worth retrying, everything else is returned to the caller as is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+USER_AGENT = "Mozilla/5.0 (compatible; GenerateDescriptions/1.0)"
+
+
+class Fetcher:
+    """Shared async HTTP client with keep-alive pooling, per-host limits and retries."""
+
+    def __init__(self, per_host_concurrency=PER_HOST_CONCURRENCY, max_retries=MAX_RETRIES, cache=None,
+                 max_bytes=MAX_BYTES):
+        self.per_host_concurrency = per_host_concurrency
+        self.max_retries = max_retries
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self._host_semaphores = {}
+        self._crawl_delays = {}
+        self._next_request_at = {}
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+        )
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_semaphores[host]
+
+    def set_crawl_delay(self, url, seconds):
+        """Space requests to the url's host at least `seconds` apart (robots.txt Crawl-delay)."""
+        self._crawl_delays[urlsplit(url).netloc.lower()] = seconds
+
+    async def _wait_crawl_delay(self, url):
+        host = urlsplit(url).netloc.lower()
+        delay = self._crawl_delays.get(host)
+        if not delay:
+            return
+        # Reserve the next slot before sleeping, so concurrent requests queue up behind each other
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_request_at.get(host, 0.0))
+        self._next_request_at[host] = start + delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def fetch(self, url, content_types=HTML_TYPES):
+        """GET a URL through the page cache.
+
+        Fresh cache hits skip the network, stale entries are revalidated
+        with a conditional request and a 304 reuses the stored body.
+        A 200 of a type outside `content_types` comes back with an empty
+        body and extensions["skipped_content_type"] set, a body cut at
+        max_bytes with extensions["truncated"] set; neither is cached.
+        """
+        if self.cache is None:
+            return await self._get(url, content_types=content_types)
+
+        cached = await asyncio.to_thread(self.cache.get, url)
+        if cached is not None and cached.is_fresh(self.cache.ttl):
+            self.cache.stats["hits"] += 1
+            return cached.to_response()
+
+        headers = cached.conditional_headers() if cached is not None else {}
+        response = await self._get(url, headers, content_types)
+        if response.status_code == 304 and cached is not None:
+            self.cache.stats["revalidated"] += 1
+            await asyncio.to_thread(self.cache.refresh, url, response)
+            return cached.to_response()
+
+        self.cache.stats["misses"] += 1
+        # Skipped and truncated bodies are not the page, a cache hit would pass them off as complete
+        if (response.status_code == 200 and not response.extensions.get("skipped_content_type")
+                and not response.extensions.get("truncated")):
+            await asyncio.to_thread(self.cache.put, url, response)
+        return response
+
+    async def _get(self, url, headers=None, content_types=HTML_TYPES):
+        """GET a URL, retrying transport errors and retryable statuses with backoff."""
+        async with self._host_semaphore(url):
+            attempt = 0
+            while True:
+                await self._wait_crawl_delay(url)
+                try:
+                    async with self._client.stream("GET", url, headers=headers) as response:
+                        if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                            return await self._read_bounded(url, response, content_types)
+                        delay = _retry_after(response)
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = None
+
+                if delay is None:
+                    delay = BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+                attempt += 1
+                logging.debug(f"Retrying {url} in {delay:.2f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+
+    async def _read_bounded(self, url, response, content_types):
+        """Read a streamed body up to max_bytes, skipping unwanted content types unread."""
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        if response.status_code == 200 and content_type and content_type not in content_types:
+            logging.info(f"Skipping {url}: {content_type}")
+            metrics.add(skipped_pages=1)
+            return _bounded_response(response, b"", skipped_content_type=content_type)
+
+        chunks = []
+        size = 0
+        truncated = False
+        # aiter_bytes decompresses chunk by chunk, so the cap also holds for compressed bodies
+        async for chunk in response.aiter_bytes():
+            if size + len(chunk) > self.max_bytes:
+                chunks.append(chunk[:self.max_bytes - size])
+                truncated = True
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        metrics.add(bytes_downloaded=response.num_bytes_downloaded)
+        if truncated:
+            logging.info(f"Truncated {url} at {self.max_bytes} bytes")
+            metrics.add(truncated_pages=1)
+        return _bounded_response(response, b"".join(chunks), truncated=truncated)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def _bounded_response(response, body, **extensions):
+    # The body is already decompressed and may be cut short
+    headers = [
+        (name, value) for name, value in response.headers.multi_items()
+        if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+    ]
+    return httpx.Response(
+        response.status_code, headers=headers, content=body, request=response.request, extensions=extensions
+    )
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if value and value.isdigit():
+        return min(float(value), 30.0)
+    return None
+
+
+# One fetcher per event loop, so connections are reused by every row on that loop
+_fetchers = weakref.WeakKeyDictionary()
+
+
+def get_fetcher():
+    loop = asyncio.get_running_loop()
+    fetcher = _fetchers.get(loop)
+    if fetcher is None:
+        fetcher = Fetcher(cache=get_page_cache())
+        _fetchers[loop] = fetcher
+    return fetcher
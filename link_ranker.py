@@ -0,0 +1,119 @@
+import os
+import re
+import unicodedata
+from urllib.parse import urlsplit
+
+
+# Ranker settings
+LINK_RANKER_TOP_K = int(os.getenv("LINK_RANKER_TOP_K", "20"))
+# Minimum score of each of the top links before the LLM call is skipped
+LINK_RANKER_CONFIDENT_SCORE = float(os.getenv("LINK_RANKER_CONFIDENT_SCORE", "6"))
+# Minimum gap between the last chosen link and the next one
+LINK_RANKER_CONFIDENT_MARGIN = float(os.getenv("LINK_RANKER_CONFIDENT_MARGIN", "3"))
+# Same limit the link ranking prompt gives the model
+MAX_RELEVANT_LINKS = 3
+
+# Keywords matched against the words of the URL path and anchor text (lowercase, no
+# diacritics). Positive ones also match words they start ('uslug' in 'uslugi-remontowe'),
+# negative ones only whole words, so 'praca' leaves 'wspolpraca' and 'cart' 'cartridges' alone.
+POSITIVE_KEYWORDS = {
+    'o-nas': 5, 'onas': 5, 'o nas': 5, 'about': 5, 'firma': 4, 'company': 4, 'kim-jestesmy': 5,
+    'oferta': 5, 'offer': 5, 'produkty': 5, 'products': 5, 'produkt': 3, 'product': 3,
+    'uslugi': 5, 'services': 5, 'uslug': 3, 'service': 3, 'dzialalnosc': 3, 'solutions': 3,
+    'kontakt': 1, 'contact': 1,
+}
+NEGATIVE_KEYWORDS = {
+    'news': -4, 'aktualnosci': -4, 'artykul': -4, 'article': -4, 'blog': -5, 'publications': -5,
+    'privacy': -5, 'polityka': -5, 'cookies': -5, 'rodo': -5, 'regulamin': -4, 'terms': -3,
+    'login': -5, 'logowanie': -5, 'koszyk': -5, 'cart': -5, 'download': -3, 'pliki': -2,
+    'galeria': -2, 'gallery': -2, 'kariera': -3, 'career': -3, 'praca': -2, 'jobs': -3,
+    'wp-content': -5, 'feed': -5, 'tag': -3, 'search': -4,
+}
+_document_pattern = re.compile(r'\.(pdf|jpe?g|png|gif|zip|docx?|xlsx?)$', re.IGNORECASE)
+# Words of a path or anchor, split on '-', '_', '/', '.', spaces and any other separator
+_word_pattern = re.compile(r'[a-z0-9]+')
+
+
+def _normalize(text):
+    # 'ł' has no NFKD decomposition, so it is mapped by hand
+    text = (text or "").replace('ł', 'l').replace('Ł', 'L')
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return text.lower()
+
+
+def _has_keyword(words, keyword, prefix):
+    """True when the keyword's words appear in order, the last one as a prefix if allowed."""
+    keyword = _word_pattern.findall(keyword)
+    *head, last = keyword
+    for i in range(len(words) - len(keyword) + 1):
+        word = words[i + len(head)]
+        if words[i:i + len(head)] == head and (word == last or (prefix and word.startswith(last))):
+            return True
+    return False
+
+
+def _keyword_score(text):
+    words = _word_pattern.findall(text)
+    score = 0
+    for keyword, weight in POSITIVE_KEYWORDS.items():
+        if _has_keyword(words, keyword, prefix=True):
+            score = max(score, weight)
+    for keyword, weight in NEGATIVE_KEYWORDS.items():
+        if _has_keyword(words, keyword, prefix=False):
+            score += weight
+    return score
+
+
+def score_link(url, info=None):
+    """Score a single link, higher means more likely useful for the description."""
+    info = info or {}
+    path = _normalize(urlsplit(url).path)
+    anchor = _normalize(info.get("text", ""))
+
+    if _document_pattern.search(path):
+        return -10.0
+
+    score = float(_keyword_score(path) + _keyword_score(anchor))
+
+    # Shallow pages are usually the main sections, deep ones are articles and products
+    depth = len([segment for segment in path.split('/') if segment])
+    score -= max(0, depth - 1) * 1.0
+
+    # Links in the navigation bar and near the top of the page are the site's main sections
+    if info.get("in_nav"):
+        score += 2.0
+    position = info.get("position")
+    if position is not None:
+        score += max(0.0, 1.0 - position / 50.0)
+    return score
+
+
+def rank_links(links):
+    """Rank links best first. `links` is a {url: info} dict or an iterable of urls."""
+    if not isinstance(links, dict):
+        links = {url: {} for url in links}
+    scored = [(url, score_link(url, info)) for url, info in links.items()]
+    # Sort by score, ties broken by url so the order is deterministic
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored
+
+
+def top_links(ranked, top_k=LINK_RANKER_TOP_K):
+    return [url for url, _ in ranked[:top_k]]
+
+
+def is_confident(ranked, score=LINK_RANKER_CONFIDENT_SCORE, margin=LINK_RANKER_CONFIDENT_MARGIN):
+    """True when the top links clearly stand out, so the LLM ranking can be skipped."""
+    if len(ranked) < MAX_RELEVANT_LINKS:
+        return False
+    chosen = ranked[:MAX_RELEVANT_LINKS]
+    if any(s < score for _, s in chosen):
+        return False
+    if len(ranked) > MAX_RELEVANT_LINKS and chosen[-1][1] - ranked[MAX_RELEVANT_LINKS][1] < margin:
+        return False
+    return True
+
+
+def heuristic_relevant_links(ranked):
+    """Pick links like the LLM ranking does, from the heuristic ranking alone."""
+    return [url for url, _ in ranked[:MAX_RELEVANT_LINKS]]
@@ -0,0 +1,236 @@
+"""Admission control for OpenAI calls under the account's RPM/TPM limits.
+
+Every call estimates its tokens (prompt plus expected completion) and waits
+in a priority queue until both the request and the token bucket can take
+it. The cheap link ranking call goes first, then map-reduce summaries,
+then description generation. A 429 pauses the whole queue with jittered
+exponential backoff (or the server's Retry-After) and the call is retried,
+so rows are delayed instead of failing. Connection errors, timeouts and
+5xx responses are retried per call (the OpenAI client's own retries are
+off, they would bypass the queue); an exhausted quota is never retried.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+import weakref
+
+import metrics
+from rate_limit import TokenBucket
+
+
+# LLM_SCHEDULER=0 sends calls straight to the API
+LLM_SCHEDULER = os.getenv("LLM_SCHEDULER", "1") == "1"
+# Account limits for the model, defaults are gpt-4o-mini tier 1
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+# Retries of connection errors, timeouts and 5xx, the OpenAI client's default
+LLM_TRANSIENT_RETRIES = int(os.getenv("LLM_TRANSIENT_RETRIES", "2"))
+# Buckets hold this many seconds of quota, so bursts stay well inside a minute's budget
+BURST_SECONDS = 10
+
+# Lower runs first
+PRIORITY_RANKING = 0
+PRIORITY_SUMMARY = 1
+PRIORITY_GENERATION = 2
+
+# Completion tokens assumed before the call, per priority
+EXPECTED_COMPLETION_TOKENS = {
+    PRIORITY_RANKING: 20,
+    PRIORITY_SUMMARY: 600,
+    PRIORITY_GENERATION: 1500,
+}
+
+
+def is_rate_limit_error(error):
+    """True for a 429 from the OpenAI client (or any error carrying that status)."""
+    return type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429
+
+
+def is_quota_error(error):
+    """True for the 429 of an account out of credit, which waiting does not fix."""
+    return getattr(error, "code", None) == "insufficient_quota"
+
+
+def is_transient_error(error):
+    """True for errors the OpenAI client would retry itself: connection, timeout, 408/409/5xx."""
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError", "InternalServerError"):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409) or status >= 500)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    def __init__(self, rpm=OPENAI_RPM, tpm=OPENAI_TPM, max_retries=LLM_MAX_RETRIES):
+        self.requests = TokenBucket(rpm / 60, capacity=max(1.0, rpm / 60 * BURST_SECONDS))
+        self.tokens = TokenBucket(tpm / 60, capacity=max(1.0, tpm / 60 * BURST_SECONDS))
+        self.max_retries = max_retries
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.stats = {"admitted": 0, "rate_limited": 0, "transient_retries": 0, "throttled_s": 0.0}
+        self._waiting = []
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+
+    @property
+    def queue_depth(self):
+        return sum(1 for _, _, _, future in self._waiting if not future.done())
+
+    async def acquire(self, priority, tokens, order=None):
+        """Wait until a call of `tokens` tokens may start; returns the seconds waited."""
+        future = asyncio.get_running_loop().create_future()
+        order = next(self._order) if order is None else order
+        heapq.heappush(self._waiting, (priority, order, tokens, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+
+        started = time.monotonic()
+        await future
+        waited = time.monotonic() - started
+        self.stats["throttled_s"] += waited
+        return waited
+
+    async def _dispatch(self):
+        while self._waiting:
+            priority, order, tokens, future = self._waiting[0]
+            if future.done():
+                # The caller was cancelled while queued
+                heapq.heappop(self._waiting)
+                continue
+            delay = max(
+                self.paused_until - time.monotonic(),
+                self.requests.delay(1),
+                self.tokens.delay(tokens),
+            )
+            if delay <= 0:
+                heapq.heappop(self._waiting)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.stats["admitted"] += 1
+                future.set_result(None)
+                continue
+            # Sleep until the head fits, or until a new (maybe more urgent) call arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the real usage of a call is known."""
+        if actual > estimated:
+            self.tokens.take(actual - estimated)
+        else:
+            self.tokens.give_back(estimated - actual)
+
+    async def _backoff(self, error, attempts):
+        """Pause the queue after a 429, wait out a transient error, or re-raise when the error is final.
+
+        `attempts` counts the retries of one call so far, per kind of error.
+        """
+        if is_rate_limit_error(error) and not is_quota_error(error):
+            attempt = attempts.get("rate_limit", 0)
+            if attempt >= self.max_retries:
+                raise error
+            attempts["rate_limit"] = attempt + 1
+            self.stats["rate_limited"] += 1
+            delay = _retry_after(error) or LLM_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            logging.warning(f"OpenAI rate limit hit, pausing calls for {delay:.1f}s (attempt {attempt + 1})")
+            return
+        if is_transient_error(error) and not is_rate_limit_error(error):
+            attempt = attempts.get("transient", 0)
+            if attempt >= LLM_TRANSIENT_RETRIES:
+                raise error
+            attempts["transient"] = attempt + 1
+            self.stats["transient_retries"] += 1
+            # Only this call waits, the API itself is not asking everyone to slow down
+            delay = LLM_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+            logging.warning(f"OpenAI call failed ({type(error).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            return
+        raise error
+
+    async def call(self, priority, prompt_tokens, make_call, completion_tokens=None):
+        """Run `make_call()` once admitted, retrying it after 429s and transient errors.
+
+        `completion_tokens(result)`, when given, settles the estimate with the real usage.
+        """
+        expected = EXPECTED_COMPLETION_TOKENS.get(priority, 0)
+        order = next(self._order)
+        attempts = {}
+        while True:
+            await self.acquire(priority, prompt_tokens + expected, order)
+            self.in_flight += 1
+            try:
+                result = await make_call()
+                if completion_tokens is not None:
+                    self.settle(expected, completion_tokens(result))
+                return result
+            except Exception as e:
+                await self._backoff(e, attempts)
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, priority, prompt_tokens, make_stream):
+        """Like call(), for a streaming call; retried only until the first chunk arrived."""
+        estimated = prompt_tokens + EXPECTED_COMPLETION_TOKENS.get(priority, 0)
+        order = next(self._order)
+        attempts = {}
+        while True:
+            await self.acquire(priority, estimated, order)
+            self.in_flight += 1
+            started = False
+            try:
+                async for chunk in make_stream():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                await self._backoff(e, attempts)
+            finally:
+                self.in_flight -= 1
+
+
+# One scheduler per event loop; the function and the bulk runner each run a single loop
+_schedulers = weakref.WeakKeyDictionary()
+
+
+def get_llm_scheduler():
+    """Return the scheduler of the running loop, or None when scheduling is off."""
+    if not LLM_SCHEDULER:
+        return None
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = LLMScheduler()
+        _schedulers[loop] = scheduler
+    return scheduler
+
+
+def _across_loops(value):
+    return lambda: sum(value(scheduler) for scheduler in list(_schedulers.values()))
+
+
+metrics.registry.register_gauge("llm_queue_depth", _across_loops(lambda s: s.queue_depth))
+metrics.registry.register_gauge("llm_in_flight", _across_loops(lambda s: s.in_flight))
+metrics.registry.register_gauge("llm_throttled_seconds_total", _across_loops(lambda s: s.stats["throttled_s"]))
+metrics.registry.register_gauge("llm_rate_limited_total", _across_loops(lambda s: s.stats["rate_limited"]))
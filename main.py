@@ -1,75 +1,474 @@
 #TODO: Debug this function, code in debug works well.
-#TODO: Add the regon verification
-#TODO: Sync with google sheets and add the output to the sheet
 #TODO: Test it.
 
+import time
+_import_started = time.perf_counter()
+
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
-from langchain.prompts.prompt import PromptTemplate
-from langchain_openai import ChatOpenAI
-from urllib.parse import urljoin
 from urllib.parse import urljoin
+from functools import lru_cache, wraps
 import re
-from output_parsers import relevant_links_parser
-import unicodedata
 import functions_framework
-import requests
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from boilerplate import remove_boilerplate
+from cleaning import clean_scraped_data, format_cleaned_data
+from browser_pool import get_browser_pool
+from discovery import DISCOVERY_SITEMAPS, DISCOVERY_TIMEOUT, SITEMAP_MIN_URLS, discover_sitemap_links
+from fetcher import get_fetcher
+import metrics
+from parsing import (
+    decode_html, parse_links, parse_links_with_stats, extract_main_text, extract_main_text_with_stats, needs_rendering,
+)
+from url_utils import canonicalize_url, is_same_site, collapse_language_variants, page_key
+from link_ranker import MAX_RELEVANT_LINKS, rank_links, top_links, is_confident, heuristic_relevant_links
+from llm_cache import get_llm_cache, make_key
+from llm_scheduler import (
+    LLM_SCHEDULER, EXPECTED_COMPLETION_TOKENS, PRIORITY_GENERATION, PRIORITY_RANKING, PRIORITY_SUMMARY,
+    get_llm_scheduler,
+)
+from page_cache import get_page_cache
+from registry import find_identifiers, merge_identifiers, verify_regon
+from result_store import get_result_store, site_fingerprint
+from sheets import get_sheets_writer
+from prompts import GET_RELEVANT_LINKS_TEMPLATE, GENERATE_DESCRIPTION_TEMPLATE, SUMMARIZE_CHUNK_TEMPLATE
+from tokens import count_tokens, allocate_budget, split_into_chunks, truncate_to_tokens
 
 
 # Load the environment variables from .env
 load_dotenv()
 
+# Root logger level of the function; without a handler only warnings would reach its logs
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+
+
+# Maximum number of rows processed at the same time in batch mode
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "10"))
+# Upper bound of the `concurrency` a batch request may ask for
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "50"))
+
+MODEL_NAME = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Token budget for the scraped data sent to generate_description
+DESCRIPTION_TOKEN_BUDGET = int(os.getenv("DESCRIPTION_TOKEN_BUDGET", "12000"))
+# Over budget, summarize chunks in parallel first (map-reduce) instead of truncating
+DESCRIPTION_MAP_REDUCE = os.getenv("DESCRIPTION_MAP_REDUCE", "1") == "1"
+MAP_CHUNK_TOKENS = int(os.getenv("MAP_CHUNK_TOKENS", "6000"))
+# Upper bound of the input summarized in map-reduce mode, keeps the cost per company bounded
+MAP_MAX_TOKENS = int(os.getenv("MAP_MAX_TOKENS", "60000"))
+# Tokens reserved for each "Source: ...\nContent:" header
+SOURCE_HEADER_TOKENS = 30
+
+# Pages prefetched while the link ranking call runs (0 turns speculation off)
+SPECULATIVE_PREFETCH = int(os.getenv("SPECULATIVE_PREFETCH", "4"))
+
+# Skip the link ranking LLM call when the local ranker is confident
+LINK_RANKER_SKIP_LLM = os.getenv("LINK_RANKER_SKIP_LLM", "1") == "1"
+# Ask for the link numbers as native JSON-schema output when the chat model supports it
+RELEVANT_LINKS_STRUCTURED = os.getenv("RELEVANT_LINKS_STRUCTURED", "1") == "1"
+
+# "lazy" defers langchain imports and chain construction to the first request,
+# "eager" does it at import time (useful with min-instances kept warm)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+
+# Time spent in each setup function: first (cold) call, last call and call count
+_setup_timings = {}
+
+def timed_setup(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                timing = _setup_timings.setdefault(name, {"calls": 0, "first_s": elapsed})
+                timing["calls"] += 1
+                timing["last_s"] = elapsed
+        return wrapper
+    return decorator
+
 
 @functions_framework.http
 def hello_http(request):
-    """HTTP Cloud Function to scrape a website, verify REGON, and generate a description."""
+    """HTTP Cloud Function to scrape a website, verify REGON, and generate a description.
+
+    Accepts either a single row (``row``/``strona_www``/``regon``) or a batch
+    payload ``{"rows": [...], "concurrency": N}`` processed concurrently.
+    A single row with ``"stream": true`` is answered with server-sent events.
+    ``"force_refresh": true`` regenerates descriptions of unchanged sites.
+    """
+    configure_logging()
         # Parse the JSON payload from the request
     request_json = request.get_json(silent=True)
 
+    # Process-wide stage metrics in Prometheus text format
+    if request.path.rstrip('/').endswith('/metrics'):
+        return metrics.registry.export_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
     if request_json:
+        if not isinstance(request_json, dict):
+            return {"error": "Payload must be a JSON object"}, 400
+        # Batch mode: process many rows concurrently on one event loop
+        if 'rows' in request_json:
+            if not isinstance(request_json['rows'], list):
+                return {"error": "rows must be a list"}, 400
+            try:
+                concurrency = int(request_json.get('concurrency', BATCH_CONCURRENCY))
+            except (TypeError, ValueError):
+                return {"error": "concurrency must be an integer"}, 400
+            concurrency = min(max(1, concurrency), BATCH_MAX_CONCURRENCY)
+            return run_async(process_batch(
+                request_json['rows'], concurrency, bool(request_json.get('report_metadata')),
+                bool(request_json.get('force_refresh')),
+            ))
+
         row = request_json.get('row', 'No row provided')
         strona_www = request_json.get('strona_www', 'No URL provided')
         regon = request_json.get('regon', 'No REGON provided')
 
-        def process_request():
-            # Get all links from the main page
-            all_links = get_all_links(strona_www)
-
-            # Get relevant links using OpenAI
-            relevant_links = get_relevant_links(list(all_links))
-
-            # Filter URLs marked as 'YES'
-            yes_urls = filter_relevant_links(relevant_links)
-
-            # Scrape data from relevant URLs
-            scraped_data = scrape_data_from_urls(yes_urls)
-
-            # Clean scraped data
-            cleaned_data = clean_and_format_scraped_data(scraped_data)
+        # Streaming mode: server-sent events with model tokens as they arrive
+        if request_json.get('stream'):
+            from flask import Response
+
+            return Response(
+                sse_events(stream_request(
+                    strona_www, request_json.get('regon'), bool(request_json.get('force_refresh')),
+                    request_json.get('row'),
+                )),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            )
+
+        metadata = {} if request_json.get('report_metadata') else None
+        result = run_async(process_request(
+            strona_www, metadata, request_json.get('regon'), bool(request_json.get('force_refresh'))
+        ))
+        # Written before responding: once the response is sent the instance may be throttled or reclaimed
+        run_async(write_back(request_json.get('row'), result, flush=True))
+        if metadata is not None:
+            result["metadata"] = metadata
+        if request_json.get('report_setup'):
+            result["setup"] = get_setup_report()
+        if request_json.get('report_cache'):
+            result["cache"] = get_cache_stats()
+        return result
+
+# Function to set up root logging for the function, on its first request rather than at
+# import, so scripts importing main (bulk.py, benchmarks) keep their own logging setup
+_logging_configured = False
+
+def configure_logging():
+    global _logging_configured
+    if _logging_configured:
+        return
+    logging.basicConfig(level=LOG_LEVEL)
+    logging.getLogger().setLevel(LOG_LEVEL)
+    _logging_configured = True
+
+# Long-lived event loop so pooled connections survive between invocations
+_loop = None
+_loop_lock = threading.Lock()
+
+def get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+    return _loop
+
+def run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+# Function to turn an async generator of (event, data) into server-sent event chunks.
+# The generator runs to completion in a single task on the loop, so context
+# (e.g. the request trace) is kept across its yields.
+def sse_events(agen):
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put(item)
+        finally:
+            items.put(None)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_loop())
+    try:
+        while (item := items.get()) is not None:
+            event, data = item
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    finally:
+        # Runs on client disconnect too, so the pipeline stops with the response
+        future.cancel()
+
+# Pipeline
+
+# `metadata`, when given, collects per-stage details (parse stats, metrics, ...) for the response
+# The stored description is returned without calling OpenAI when the site
+# text did not change since it was generated, unless `force_refresh` is set
+async def process_request(strona_www, metadata=None, regon=None, force_refresh=False):
+    identifiers = {}
+    with metrics.start_trace() as trace:
+        cleaned_pages = await collect_cleaned_pages(strona_www, metadata, identifiers)
+        verification = await verify_regon(regon, identifiers) if regon else None
+        fingerprint = input_fingerprint(cleaned_pages)
+        description = None if force_refresh else await lookup_result(strona_www, regon, fingerprint, metadata)
+
+        if description is None:
+            cleaned_data = await prepare_description_input(cleaned_pages, metadata)
 
             # Generate description
-            description = generate_description(cleaned_data)
-
-            return {
-                "description": description
-            }
-
-        return process_request()
+            with metrics.span("generate"):
+                description = (await generate_description(cleaned_data)).content
+            await store_result(strona_www, regon, fingerprint, description)
+        metrics.log_payload("Description", description)
+
+    if metadata is not None:
+        metadata["metrics"] = trace.to_dict()
+    result = {
+        "description": description
+    }
+    if verification is not None:
+        result["regon_verification"] = verification
+    return result
+
+# Function to stream a row: stage events, then model tokens, then one final
+# event with the complete text and the stage metadata
+async def stream_request(strona_www, regon=None, force_refresh=False, row=None):
+    metadata = {}
+    identifiers = {}
+    try:
+        with metrics.start_trace() as trace:
+            yield "stage", {"stage": "collecting"}
+            cleaned_pages = await collect_cleaned_pages(strona_www, metadata, identifiers)
+            if regon:
+                metadata["regon_verification"] = await verify_regon(regon, identifiers)
+            fingerprint = input_fingerprint(cleaned_pages)
+            description = None if force_refresh else await lookup_result(strona_www, regon, fingerprint, metadata)
+
+            if description is None:
+                cleaned_data = await prepare_description_input(cleaned_pages, metadata)
+
+                yield "stage", {"stage": "generating"}
+                parts = []
+                with metrics.span("generate"):
+                    async for text in stream_description(cleaned_data):
+                        parts.append(text)
+                        yield "token", {"text": text}
+                description = "".join(parts)
+                await store_result(strona_www, regon, fingerprint, description)
+            else:
+                yield "token", {"text": description}
+
+        metadata["metrics"] = trace.to_dict()
+        result = {"description": description}
+        if "regon_verification" in metadata:
+            result["regon_verification"] = metadata["regon_verification"]
+        await write_back(row, result, flush=True)
+        yield "done", {"description": description, "metadata": metadata}
+    except Exception as e:
+        logging.exception(f"Streaming request failed for {strona_www}")
+        yield "error", {"error": f"{type(e).__name__}: {e}", "metadata": metadata}
+
+# Function to discover, rank, fetch and clean the company's pages, returns {url: cleaned text}
+# NIPs and REGONs printed on the pages are collected into `identifiers` when given.
+async def collect_cleaned_pages(strona_www, metadata=None, identifiers=None):
+    parse_stats = metadata.setdefault("parse", []) if metadata is not None else None
+
+    # Get all links from the main page
+    with metrics.span("link_discovery"):
+        all_links = await get_all_links(strona_www, parse_stats, identifiers)
+
+    # Rank links locally; only the best candidates go to OpenAI and the call
+    # is skipped when the heuristic is confident on its own
+    ranked_links = rank_links(all_links)
+    prefetched = {}
+    try:
+        with metrics.span("ranking"):
+            if LINK_RANKER_SKIP_LLM and is_confident(ranked_links):
+                relevant_links = heuristic_relevant_links(ranked_links)
+            else:
+                # While the model ranks links, fetch and extract the likeliest
+                # pages (and the homepage) so the network is not idle
+                speculative_urls = top_links(ranked_links, SPECULATIVE_PREFETCH) if SPECULATIVE_PREFETCH else []
+                homepage = next((link for link in all_links if page_key(link) == page_key(strona_www)), None)
+                if SPECULATIVE_PREFETCH and homepage is not None and homepage not in speculative_urls:
+                    speculative_urls.append(homepage)
+                with metrics.use_span("fetch"):
+                    prefetched = {
+                        url: asyncio.create_task(fetch_page_text(url, parse_stats)) for url in speculative_urls
+                    }
+                relevant_links = await get_relevant_links(top_links(ranked_links))
+
+        # Chosen URLs, most relevant first
+        rank = {url: index for index, (url, _) in enumerate(ranked_links)}
+        yes_urls = sorted(relevant_links, key=lambda url: rank.get(url, len(rank)))
+
+        # Scrape data from relevant URLs, reusing pages prefetched above
+        with metrics.span("fetch"):
+            scraped_data = await scrape_data_from_urls(yes_urls, parse_stats, prefetched)
+    finally:
+        # Drop speculative work the model did not pick (or everything, on error)
+        for task in prefetched.values():
+            task.cancel()
+
+    if metadata is not None and prefetched:
+        metadata["speculative"] = {
+            "prefetched": len(prefetched),
+            "used": len([url for url in yes_urls if url in prefetched]),
+        }
+
+    metrics.log_payload("Scraped data", scraped_data)
+    if identifiers is not None:
+        for text in scraped_data.values():
+            merge_identifiers(identifiers, find_identifiers(text))
+
+    with metrics.span("clean"):
+        # Strip menus, headers and footers shared by the company's pages
+        scraped_data = await run_cpu(remove_boilerplate, scraped_data)
+
+        # Clean scraped data
+        return await run_cpu(clean_scraped_data, scraped_data)
+
+# Fingerprint of everything the description depends on: cleaned site text, model and prompt
+def input_fingerprint(cleaned_pages):
+    return site_fingerprint(format_cleaned_data(cleaned_pages), MODEL_NAME, GENERATE_DESCRIPTION_TEMPLATE)
+
+# Function to return the stored description if its fingerprint still matches
+async def lookup_result(strona_www, regon, fingerprint, metadata=None):
+    store = get_result_store()
+    if store is None:
+        return None
+    description = await asyncio.to_thread(store.lookup, canonicalize_url(strona_www), regon, fingerprint)
+    if metadata is not None:
+        metadata["result_store"] = "unchanged" if description is not None else "regenerated"
+    return description
+
+async def store_result(strona_www, regon, fingerprint, description):
+    store = get_result_store()
+    if store is not None:
+        await asyncio.to_thread(store.put, canonicalize_url(strona_www), regon, fingerprint, description)
+
+# Function to process a list of rows with bounded concurrency
+async def process_batch(rows, concurrency=BATCH_CONCURRENCY, report_metadata=False, force_refresh=False):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded_row(index, row_json):
+        async with semaphore:
+            return await process_row(index, row_json, report_metadata, force_refresh)
+
+    # Results keep the order of the input rows; one failing row does not fail the batch
+    results = await asyncio.gather(
+        *(bounded_row(index, row_json) for index, row_json in enumerate(rows))
+    )
+    writer = get_sheets_writer()
+    if writer is not None:
+        await writer.flush()
+    return {
+        "results": results,
+        "succeeded": sum(1 for r in results if "error" not in r),
+        "failed": sum(1 for r in results if "error" in r),
+    }
+
+# Function to process one input row, errors are returned in the result instead of raised
+async def process_row(index, row_json, report_metadata=False, force_refresh=False):
+    if not isinstance(row_json, dict):
+        return {"row": index, "error": "Row must be a JSON object"}
+    row = row_json.get('row', index)
+    strona_www = row_json.get('strona_www')
+    if not strona_www:
+        return {"row": row, "error": "No URL provided"}
+    try:
+        metadata = {} if report_metadata else None
+        result = await process_request(
+            strona_www, metadata, row_json.get('regon'), force_refresh or bool(row_json.get('force_refresh'))
+        )
+        if metadata is not None:
+            result["metadata"] = metadata
+    except Exception as e:
+        return {"row": row, "error": f"{type(e).__name__}: {e}"}
+    # Only an explicit `row` is a sheet row, the index is just the position in the input
+    await write_back(row_json.get('row'), result)
+    return {"row": row, **result}
+
+# Function to queue a result for the Google Sheets writeback, a no-op when it is off
+# `flush` writes it out right away instead of with the next batch, for single-row calls
+async def write_back(row, result, flush=False):
+    writer = get_sheets_writer()
+    if writer is not None and row is not None:
+        writer.add(row, result)
+        if flush:
+            await writer.flush()
+
+# CPU-bound steps (text extraction, boilerplate removal, cleaning) run here.
+# Worker threads by default; bulk.py installs a process pool.
+_cpu_executor = None
+
+def use_cpu_executor(executor):
+    global _cpu_executor
+    _cpu_executor = executor
+
+async def run_cpu(func, *args):
+    if _cpu_executor is None:
+        return await asyncio.to_thread(func, *args)
+    return await asyncio.get_running_loop().run_in_executor(_cpu_executor, func, *args)
 
 # Helper functions
 
-def get_all_links(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    full_links = set()
+# Returns {url: {"text", "position", "in_nav", "lang"}} so links can be ranked locally.
+# Links are canonicalized, off-site links dropped and language versions collapsed;
+# http/https and www/non-www variants of a page are kept once, under the first url seen.
+async def get_all_links(url, parse_stats=None, identifiers=None):
+    # robots.txt and sitemaps are read while the homepage downloads, for at most
+    # DISCOVERY_TIMEOUT seconds; a slow sitemap host leaves the homepage links
+    discovered = {}
+    discovery = None
+    if DISCOVERY_SITEMAPS:
+        discovery = asyncio.create_task(
+            asyncio.wait_for(discover_sitemap_links(url, discovered=discovered), DISCOVERY_TIMEOUT)
+        )
+    try:
+        response = await get_fetcher().fetch(url)
+        metrics.add(pages_fetched=1)
+        if discovery is not None:
+            try:
+                await discovery
+            except asyncio.TimeoutError:
+                logging.info(f"Sitemap discovery for {url} timed out, {len(discovered)} urls found so far")
+            except Exception as e:
+                logging.warning(f"Sitemap discovery for {url} failed: {e!r}")
+    finally:
+        if discovery is not None:
+            discovery.cancel()
+    sitemap_links = list(discovered.values())
+    # The sitemap already lists the pages, so the browser is not needed to find the menu
+    content = await html_from_response(url, response, render=len(sitemap_links) < SITEMAP_MIN_URLS)
+    # The homepage footer is where NIP/REGON usually are, scraped text drops footers
+    if identifiers is not None:
+        merge_identifiers(identifiers, find_identifiers(content))
+    # Parsed off the event loop, a big homepage would hold up every other row
+    if parse_stats is None:
+        anchors = await run_cpu(parse_links, content, url)
+    else:
+        anchors, stats = await run_cpu(parse_links_with_stats, content, url)
+        parse_stats.extend(stats)
+
+    full_links = {}
+    # page_key -> url in full_links
+    seen = {}
     phone_pattern = re.compile(r'^[\+\d\-\(\)\s]+$')
     email_pattern = re.compile(r'.+@.+\..+')
     keyword_pattern = re.compile(r'blog|publications', re.IGNORECASE)
 
-    for a in soup.find_all('a', href=True):
-        href = a.get('href').strip()
+    for position, (href, text, in_nav, hreflang) in enumerate(anchors):
+        href = href.strip()
         if (
             href.startswith('mailto:') or
             href.startswith('tel:') or
@@ -79,182 +478,353 @@ def get_all_links(url):
         ):
             continue
 
-        full_url = urljoin(url, href)
-        full_links.add(full_url)
-
-    return full_links
-
-def get_relevant_links(urls):
-
-    get_relevant_links_template = """
-    # Kontekst
-    Jeteś asystentem którego zadaniem jest jak najlepsze oznaczenie linków ze strony firmy pod kątem istotności znajdujących się informacji pod tymi linkami w kontekście stworzenia opisu firmy.
-    # Zadanie
-    Na podstawie podanych linków, oznacz te, pod którymi, z największym prawdopodobieństwem znajdują się istotne informacje do stworzenia opisu firmy.
-    Aby lepiej oznaczyć linki przeanalizuj kryteria opisu firmy, które będą używanie do stworzenia takiego opisu.
-    # Kryteria opisu
-    - Opis powinien być zwięzły, więc nie jest konieczne oznaczanie wszystkich linków, a jedynie te, które zawierają najważniejsze informacje.
-    - Opis powinien zawierać informacje o firmie, takie jak:
-        - Co firma oferuje, czy sprzedaje produkty, czy usługi, czy jest dystrybutorem?
-        - W jakiej branży działa firma?
-    # Podsumowanie
-    Głównie zwracaj uwagę na zakładki typu 'o nas', 'produkty, 'usługi', 'kontakt'
-    Unikaj oznaczania linków do blogów, artykułów, publikacji, itp.
-    Oznacz link 'YES' jeśli zawiera on informacje istotne, a 'NO' jeśli nie zawiera.
-    Oznaczone przez Ciebie linki będą programistycznie scrapowane, a ich zawartość będzie użyta do stworzenia opisu firmy. Dlatego ważne jest abyś zawsze oznaczał linki zgodnie z kryteriami, i wielkością liter 'YES' lub 'NO'.
-    Linki: {urls}
-    # Odpowiedź
-    W odpowiedzi nie pomijaj żadnego linku. 
-    Liczba linków i linki powinny zgadzać się z podanymi. Dodaj jedynie oznaczenia 'YES' lub 'NO' dla każdego linku.
-    Maksymalnie oznacz 3 najistotniejsze linki, ponieważ są one scrapowane i naszym celem jest uniknięcie zbyt dużej ilości niepotrzebnych informacji.
-    NIE możesz oznaczyć więcej niż 3 linki jako 'YES'. Wybierz naistotniejsze pod względem kryteriów.
-    Nie dodawaj żadnych dodatkowych informacji, podaj JEDYNIE listę linków.
-    Teraz przeanalizuj podane informacje i oznacz linki jako 'YES' lub 'NO'.
-    \n{format_instructions}
-    """
-    
-    get_relevant_links_prompt_template = PromptTemplate(
-        input_variables=["urls"],
-        template=get_relevant_links_template,
-        partial_variables={
-            "format_instructions": relevant_links_parser.get_format_instructions()
-        },
-    )
-    
-    # create the llm
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
-
-    # Combine the prompt and the LLM chain
-    chain = get_relevant_links_prompt_template | llm | relevant_links_parser
-
-    res = chain.invoke(input={"urls": urls})
-
-    return res
-
-# Function to filter relevant links
-def filter_relevant_links(links_output):
-    # Access the 'links' dictionary within the RelevantLinksOutput object
-    links_dict = links_output.links
-    
-    # Filter links that are marked as 'YES'
-    relevant_links = {url for url, relevance in links_dict.items() if relevance == 'YES'}
-    
+        try:
+            full_url = urljoin(url, href)
+            if not is_same_site(full_url, url):
+                continue
+            key = page_key(full_url)
+        except ValueError:
+            # Malformed href (bad port, broken IPv6 host), one bad link must not fail the row
+            continue
+        full_url = seen.setdefault(key, canonicalize_url(full_url))
+        if full_url in full_links:
+            # Keep the first position, but remember every anchor text
+            if text and text not in full_links[full_url]["text"]:
+                full_links[full_url]["text"] += " " + text
+            continue
+        full_links[full_url] = {
+            "text": text,
+            "position": position,
+            "in_nav": in_nav,
+            "lang": hreflang,
+        }
+
+    # Pages only the sitemap lists, e.g. behind JavaScript menus, rank after the homepage links
+    for sitemap_url in sitemap_links:
+        if page_key(sitemap_url) not in seen:
+            seen[page_key(sitemap_url)] = sitemap_url
+            full_links[sitemap_url] = {"text": "", "position": None, "in_nav": False, "lang": None}
+
+    return collapse_language_variants(full_links)
+
+# Function to let the model pick the relevant links. They are sent as a numbered
+# list and only the chosen numbers come back, returns the chosen urls.
+async def get_relevant_links(urls):
+    from langchain_core.exceptions import OutputParserException
+    from output_parsers import RelevantLinksOutput, as_links_output, format_numbered_links
+
+    # `urls` come best first, which is also the fallback when the reply is unusable
+    fallback = list(urls)[:MAX_RELEVANT_LINKS]
+    # Sorted so the same link set always renders the same prompt and cache key
+    urls = sorted(urls)
+    inputs = {"urls": format_numbered_links(urls)}
+    chain = get_relevant_links_chain()
+    prompt = chain.first.format(**inputs)
+    cache = get_llm_cache()
+    if cache is not None:
+        key = make_key(MODEL_NAME, prompt, inputs)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return filter_relevant_links(RelevantLinksOutput(**cached), urls)
+
+    try:
+        res = as_links_output(await scheduled_call(PRIORITY_RANKING, prompt, lambda: chain.ainvoke(input=inputs)))
+    except OutputParserException as e:
+        logging.warning(f"Could not parse the link ranking reply: {e}")
+        res = None
+    if res is None:
+        # e.g. no tool call or no JSON in the reply; the local ranking still has an answer
+        logging.warning("Link ranking reply unusable, keeping the top ranked links")
+        metrics.record_llm_call(prompt, "", MODEL_NAME)
+        return fallback
+    metrics.record_llm_call(prompt, res.model_dump_json(), MODEL_NAME)
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, res.model_dump())
+    return filter_relevant_links(res, urls)
+
+# Function to map the numbers the model chose back to urls, invalid numbers are dropped
+def filter_relevant_links(links_output, urls):
+    from output_parsers import links_from_numbers
+
+    relevant_links = links_from_numbers(links_output, urls)
+    if len(relevant_links) != len(links_output.links):
+        logging.warning(f"Dropped invalid link numbers from {links_output.links} for {len(urls)} links")
     return relevant_links
 
 # Function to scrape data from urls
-def scrape_data_from_urls(yes_urls):
+# `prefetched` maps urls to already running fetch_page_text tasks
+async def scrape_data_from_urls(yes_urls, parse_stats=None, prefetched=None):
+    prefetched = prefetched or {}
+    yes_urls = list(yes_urls)
+    texts = await asyncio.gather(
+        *(prefetched[url] if url in prefetched else fetch_page_text(url, parse_stats) for url in yes_urls),
+        return_exceptions=True,
+    )
     data = {}
-    for url in yes_urls:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        data[url] = soup.get_text()
+    for url, text in zip(yes_urls, texts):
+        # A single failing page should not fail the whole row
+        if isinstance(text, Exception):
+            logging.warning(f"Failed to fetch {url}: {text!r}")
+            continue
+        data[url] = text
     return data
 
-# TODO: Adjust cleaning for nip and regon
-def clean_and_format_scraped_data(scraped_data):
-    cleaned_data = {}
-    nip_pattern = r'\bNIP\s*\d{3}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2}\b'
-    regon_pattern = r'\bREGON\s*\d{9}\b'
-
-    noisy_patterns = [
-        r'\s+', 
-        r'\b(Polityka prywatności|Zastrzeżenia|Wszelkie prawa zastrzeżone|Cookies)\b',
-        r'(?:facebook|twitter|linkedin|instagram)\.com'
-    ]
+# Function to fetch one page and extract its text, extraction runs in a worker
+# thread so it overlaps with other rows and with in-flight LLM calls
+async def fetch_page_text(url, parse_stats=None):
+    content = await fetch_html(url)
+    if parse_stats is None:
+        return await run_cpu(extract_main_text, content, url)
+    # Stats are returned rather than appended, the worker may be another process
+    text, stats = await run_cpu(extract_main_text_with_stats, content, url)
+    parse_stats.extend(stats)
+    return text
+
+# Function to get the HTML of a page: static fetch first, headless browser
+# only for pages that look rendered by JavaScript
+async def fetch_html(url):
+    response = await get_fetcher().fetch(url)
+    metrics.add(pages_fetched=1)
+    return await html_from_response(url, response)
+
+async def html_from_response(url, response, render=True):
+    if response.extensions.get("truncated"):
+        metrics.record_truncated(url)
+    # Not HTML (PDF, image, ...): nothing to read and nothing to render
+    if response.extensions.get("skipped_content_type"):
+        return ""
+    # Decoded here with the HTTP charset, which the parsers would not see in the bytes
+    content = decode_html(response.content, response.charset_encoding)
+    if not render or not needs_rendering(content):
+        return content
+
+    pool = get_browser_pool()
+    if pool is None:
+        return content
+    try:
+        return await pool.render(url)
+    except Exception as e:
+        logging.warning(f"Rendering {url} failed, using the static HTML: {e!r}")
+        return content
 
-    repeated_block_patterns = [
-        r'(\+?\d[\d\s\-\(\)]{7,})',
-        r'\S+@\S+',
-    ]
-
-    for url, content in scraped_data.items():
-        content = unicodedata.normalize("NFKD", content)
-        content = re.sub(r'\s+', ' ', content).strip()
-
-        nip_match = re.search(nip_pattern, content)
-        regon_match = re.search(regon_pattern, content)
-        nip = nip_match.group(0) if nip_match else ""
-        regon = regon_match.group(0) if regon_match else ""
+# Function to generate description
+async def generate_description(cleaned_data):
+    from langchain_core.messages import AIMessage
 
-        for pattern in repeated_block_patterns:
-            content = re.sub(pattern, '', content)
-        for pattern in noisy_patterns:
-            content = re.sub(pattern, '', content)
+    content = await invoke_text_chain(
+        generate_description_chain(), get_generate_description_prompt(), {"cleaned_data": cleaned_data},
+        PRIORITY_GENERATION,
+    )
+    return AIMessage(content=content)
+
+# Function to stream the description text as the model produces it
+async def stream_description(cleaned_data):
+    inputs = {"cleaned_data": cleaned_data}
+    prompt = get_generate_description_prompt().format(**inputs)
+    cache = get_llm_cache()
+    if cache is not None:
+        key = make_key(MODEL_NAME, prompt, inputs)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            yield cached["content"]
+            return
+
+    parts = []
+    scheduler = get_llm_scheduler()
+    make_stream = lambda: generate_description_chain().astream(input=inputs)
+    if scheduler is not None:
+        chunks = scheduler.stream(PRIORITY_GENERATION, count_tokens(prompt, MODEL_NAME), make_stream)
+    else:
+        chunks = make_stream()
+    async for chunk in chunks:
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    if scheduler is not None:
+        scheduler.settle(EXPECTED_COMPLETION_TOKENS[PRIORITY_GENERATION], count_tokens("".join(parts), MODEL_NAME))
+    metrics.record_llm_call(prompt, "".join(parts), MODEL_NAME)
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, {"content": "".join(parts)})
+
+# Function to summarize one chunk of scraped data in map-reduce mode
+async def summarize_chunk(chunk):
+    return await invoke_text_chain(
+        summarize_chunk_chain(), get_summarize_chunk_prompt(), {"chunk": chunk}, PRIORITY_SUMMARY
+    )
 
-        lines = content.split('. ')
-        seen = set()
-        deduplicated_lines = []
+# Function to run an LLM call once the rate-limit scheduler admits it
+# (straight away when scheduling is off). `completion_text(result)` settles the token estimate.
+async def scheduled_call(priority, prompt, make_call, completion_text=None):
+    scheduler = get_llm_scheduler()
+    if scheduler is None:
+        return await make_call()
+    completion_tokens = None
+    if completion_text is not None:
+        completion_tokens = lambda result: count_tokens(completion_text(result), MODEL_NAME)
+    return await scheduler.call(priority, count_tokens(prompt, MODEL_NAME), make_call, completion_tokens)
+
+# Function to run a prompt | llm chain through the LLM cache, returns the text
+async def invoke_text_chain(chain, prompt_template, inputs, priority=PRIORITY_GENERATION):
+    prompt = prompt_template.format(**inputs)
+    cache = get_llm_cache()
+    if cache is not None:
+        key = make_key(MODEL_NAME, prompt, inputs)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached["content"]
+
+    res = await scheduled_call(priority, prompt, lambda: chain.ainvoke(input=inputs), lambda res: res.content)
+    metrics.record_llm_call(prompt, res.content, MODEL_NAME)
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, {"content": res.content})
+    return res.content
+
+# Function to build the generate_description input within DESCRIPTION_TOKEN_BUDGET.
+# `cleaned_pages` is {url: text} ordered by relevance.
+async def prepare_description_input(cleaned_pages, metadata=None):
+    # Same stage as cleaning in the request metrics
+    with metrics.span("clean"):
+        cleaned_data = format_cleaned_data(cleaned_pages)
+        input_tokens = count_tokens(cleaned_data, MODEL_NAME)
+        budget_info = {"input_tokens": input_tokens, "budget": DESCRIPTION_TOKEN_BUDGET, "mode": "direct"}
+
+        if input_tokens > DESCRIPTION_TOKEN_BUDGET and DESCRIPTION_MAP_REDUCE:
+            # Map: summarize chunks of every page in parallel, Reduce: describe from the summaries
+            pages = allocate_budget(
+                cleaned_pages, MAP_MAX_TOKENS - SOURCE_HEADER_TOKENS * len(cleaned_pages), MODEL_NAME
+            )
+            chunks = [
+                format_cleaned_data({url: chunk})
+                for url, text in pages.items()
+                for chunk in split_into_chunks(text, MAP_CHUNK_TOKENS, MODEL_NAME)
+            ]
+            with metrics.span("summarize"):
+                summaries = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+            cleaned_data = "\n\n".join(summary.strip() for summary in summaries if summary.strip())
+            cleaned_data = truncate_to_tokens(cleaned_data, DESCRIPTION_TOKEN_BUDGET, MODEL_NAME)
+            budget_info.update(mode="map_reduce", chunks=len(chunks))
+        elif input_tokens > DESCRIPTION_TOKEN_BUDGET:
+            pages = allocate_budget(
+                cleaned_pages, DESCRIPTION_TOKEN_BUDGET - SOURCE_HEADER_TOKENS * len(cleaned_pages), MODEL_NAME
+            )
+            cleaned_data = format_cleaned_data(pages)
+            budget_info.update(mode="truncated", sources=len(pages))
+
+    if metadata is not None:
+        budget_info["output_tokens"] = count_tokens(cleaned_data, MODEL_NAME)
+        metadata["description_input"] = budget_info
+    metrics.log_payload("Description input", cleaned_data)
+    return cleaned_data
+
+# Chain construction
+# Langchain is imported on first use and every chain is built once per process.
+
+# Chat model used instead of ChatOpenAI when set, see use_llm()
+_llm_override = None
+
+@timed_setup("llm")
+@lru_cache(maxsize=None)
+def get_llm():
+    if _llm_override is not None:
+        return _llm_override
+    from langchain_openai import ChatOpenAI
+    # The scheduler retries rate limits, connection errors, timeouts and 5xx itself;
+    # client retries would bypass its queue
+    return ChatOpenAI(temperature=0, model_name=MODEL_NAME, max_retries=0 if LLM_SCHEDULER else 2)
+
+# Function to swap the chat model (e.g. a fake one for offline benchmarks), rebuilds the chains
+def use_llm(llm):
+    global _llm_override
+    _llm_override = llm
+    for builder in (get_llm, get_relevant_links_chain, generate_description_chain, summarize_chunk_chain):
+        builder.__wrapped__.cache_clear()
+
+# With native structured output the schema goes to the API, not into the prompt
+@lru_cache(maxsize=None)
+def get_relevant_links_prompt(structured=False):
+    from langchain.prompts.prompt import PromptTemplate
+    from output_parsers import relevant_links_parser
+
+    return PromptTemplate(
+        input_variables=["urls"],
+        template=GET_RELEVANT_LINKS_TEMPLATE,
+        partial_variables={
+            "format_instructions": "" if structured else relevant_links_parser.get_format_instructions()
+        },
+    )
 
-        for line in lines:
-            if line not in seen:
-                seen.add(line)
-                deduplicated_lines.append(line)
+@lru_cache(maxsize=None)
+def get_generate_description_prompt():
+    from langchain.prompts.prompt import PromptTemplate
 
-        content = '. '.join(deduplicated_lines)
-        content = re.sub(r'\n{2,}', '\n', content)
+    return PromptTemplate(
+        input_variables=["cleaned_data"],
+        template=GENERATE_DESCRIPTION_TEMPLATE,
+    )
 
-        if nip:
-            content += f"\nNIP: {nip}"
-        if regon:
-            content += f"\nREGON: {regon}"
+@lru_cache(maxsize=None)
+def get_summarize_chunk_prompt():
+    from langchain.prompts.prompt import PromptTemplate
 
-        if content:
-            cleaned_data[url] = content
+    return PromptTemplate(
+        input_variables=["chunk"],
+        template=SUMMARIZE_CHUNK_TEMPLATE,
+    )
 
-    formatted_data = ""
-    for url, content in cleaned_data.items():
-        formatted_data += f"Source: {url}\nContent:\n{content}\n\n"
+@timed_setup("relevant_links_chain")
+@lru_cache(maxsize=None)
+def get_relevant_links_chain():
+    from output_parsers import RELEVANT_LINKS_SCHEMA, relevant_links_parser
 
-    return formatted_data
+    # Native JSON-schema output where the model supports it, parsing the text otherwise.
+    # The schema goes as a dict, which every langchain-openai version takes for json_schema mode
+    if RELEVANT_LINKS_STRUCTURED:
+        try:
+            structured_llm = get_llm().with_structured_output(RELEVANT_LINKS_SCHEMA, method="json_schema")
+            return get_relevant_links_prompt(structured=True) | structured_llm
+        except (NotImplementedError, TypeError, ValueError):
+            logging.info("Chat model has no structured output, parsing link numbers from text")
 
-# Function to generate description
-def generate_description(cleaned_data):
-
-    generate_description_template = """
-    # Kontekst
-    Jesteś asystentem którego zadaniem jest generowanie opisu firmy na podstawie danych zebranych ze stron internetowych.
-    Otrzymasz dane zescrapowane ze stron internetowych, na podstawie których powinieneś stworzyć opis firmy.
-    Dane te zawierają informacje o firmie, jej produktach, usługach, branży, itp.
-    Mogą to być dane w różnych językach jednak twoim zadaniem jest zawsze stworzenie opisu w języku Polskim.
-    # Zadanie
-    Stwórz opis firmy na podstawie podanych danych. Zgodnie z podanymi poniżej kryteriami.
-    # Kryteria opisu
-    - Opis powinien być zwięzły, ale zawierać wszystkie informacje o firmie określone w kryteriach opisu.
-    - Opis powinien być w pełni oparty na podstawie podanych danych. Nie dodawaj własnych informacji. Jeśli jakiś informacji nie ma w podanych danych, nie podawaj ich w opisie.
-    - Opis powinien być w języku Polskim.
-    - Opis powinien być podzielony na dwie sekcje i zawierać informacje takie jak:
-    SEKCJA 1: Profil funkcjonalny firmy
-        - Co firma jest producentem, dystrybutorem czy usługodawcą.
-        - Zwracaj uwagę czy wskazana spółka posiada jakieś unikalne aktywa, jeżeli będą takie informacje na jej stronie internetowej, np. jest właścicielem znaków towarowych, patentów, unikalnych linii produkcyjnych itp.
-        - Zwracaj uwagę czy firma prezentuje informacje o kanałach dystrybucji jakie stosuje albo jakiego rodzaju klientów obsługuje i w jakiej formule.
-        - Zwracaj uwagę jak kompleksowy jest jej profil funkcjonalny np. czy jest producentem kontraktowym, który wytwarza produkty według receptur i pod brandem zleceniodawców, czy też ma swoje własne receptury, własne brandy i samodzielnie sprzedaje produkty poprzez własne sklepy stacjonarne.
-        - Uwzględnij również informację czy nie jest podmiotem działającym w ramach grupy kapitałowej i czy nie ma podmiotów powiązanych, jeżeli informacje na jej stronie internetowej będą na to wskazywać.
-    SEKCJA 2: Oferta produktowa/usługowa
-        - Przedstaw pełną listę produktów / usług oferowanych przez spółkę.
-
-    Opis powinienen być szczegółowy, wyczerpujący i zawierać wszystkie informacje,
-    które uda się odnaleźć w podanych poniżej danych. Pomijaj w opisach informacje
-    dotyczące historii działalności spółki, kto ją założył, doświadczenia spółki, uzyskanych
-    nagród, cen produktów, dokładnej charakterystyki, składu czy zastosowania
-    produktów.
-    # Dane
-    Dane: {cleaned_data}
-    # Odpowiedź
-    W odpowiedzi nie używaj zwrotów typu, "oto odpowiedź", tylko odrazu podawaj opis. Nie dodawaj żadnych dodatkowych informacji, podaj JEDYNIE opis firmy zgodny z kryteriami.
-    ## Przykładowy opis(SEKCJA 1 + SEKCJA 2)
-    Darco Sp. z o.o. to jedna z wiodących firm w Polsce w branży instalacyjnej, specjalizująca się w produkcji systemów wentylacyjnych, kominowych oraz dystrybucji gorącego powietrza. Firma została założona w 1992 roku i od tego czasu dynamicznie rozwija swoją ofertę, obejmującą nowoczesne rozwiązania do wentylacji i ogrzewania. Darco prowadzi także działalność badawczo-rozwojową, posiada własne laboratoria oraz oferuje usługi technicznego doradztwa i kooperacji produkcyjnej.
-    Oferta Darco obejmuje szeroką gamę produktów, w tym systemy wentylacyjne, nasady kominowe, systemy dystrybucji gorącego powietrza, rury kominowe oraz różnorodne akcesoria związane z instalacjami wentylacyjnymi i kominowymi. Firma specjalizuje się również w produkcji systemów hybrydowej wentylacji, które są stosowane w budynkach mieszkalnych i przemysłowych. Darco kładzie duży nacisk na jakość swoich produktów oraz ich innowacyjność, co pozwala na spełnienie najwyższych standardów rynkowych.
-    # Podsumowanie
-    Ten opis jest bardzo ważny dla firmy, ponieważ będzie on wykorzystany do stworzenia opisu firmy na stronie internetowej. Dlatego ważne jest, aby opis był zgodny z podanymi kryteriami i zawierał wszystkie informacje z podanych danych.
-    Jest on również bardzo ważny dla mojej kariery zawodowej, moje życie zależy od tego, czy będę w stanie stworzyć ten opis. Dlatego poświęć na to zadanie dużo uwagi i staraj się jak najlepiej spełnić podane kryteria.
-    """
+    # Combine the prompt and the LLM chain
+    return get_relevant_links_prompt() | get_llm() | relevant_links_parser
+
+@timed_setup("generate_description_chain")
+@lru_cache(maxsize=None)
+def generate_description_chain():
+    return get_generate_description_prompt() | get_llm()
+
+@timed_setup("summarize_chunk_chain")
+@lru_cache(maxsize=None)
+def summarize_chunk_chain():
+    return get_summarize_chunk_prompt() | get_llm()
+
+# Function to report page and LLM cache counters for this process
+def get_cache_stats():
+    page_cache = get_page_cache()
+    llm_cache = get_llm_cache()
+    result_store = get_result_store()
+    return {
+        "page_cache": dict(page_cache.stats) if page_cache is not None else None,
+        "llm_cache": dict(llm_cache.stats) if llm_cache is not None else None,
+        "result_store": dict(result_store.stats) if result_store is not None else None,
+    }
+
+# Function to report cold-start and setup timings for this process
+def get_setup_report():
+    return {
+        "startup_mode": STARTUP_MODE,
+        "module_import_s": round(MODULE_IMPORT_S, 4),
+        "setup": {
+            name: {"calls": t["calls"], "first_s": round(t["first_s"], 4), "last_s": round(t["last_s"], 4)}
+            for name, t in _setup_timings.items()
+        },
+    }
 
-    generate_description_prompt_template = PromptTemplate(
-        input_variables=["cleaned_data"],
-        template=generate_description_template,
-    )
-    
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
-    chain = generate_description_prompt_template | llm
-    res_descripion = chain.invoke(input={"cleaned_data": cleaned_data})
-    return res_descripion
+# In eager mode, pay the setup cost while the instance starts instead of on the first request
+MODULE_IMPORT_S = time.perf_counter() - _import_started
+if STARTUP_MODE == "eager":
+    get_relevant_links_chain()
+    generate_description_chain()
@@ -0,0 +1,237 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# Share of requests whose full payloads (scraped text, prompts, outputs) are logged
+DEBUG_PAYLOAD_SAMPLE_RATE = float(os.getenv("DEBUG_PAYLOAD_SAMPLE_RATE", "0"))
+# METRICS_LOG=1 writes one structured JSON line per request
+METRICS_LOG = os.getenv("METRICS_LOG", "0") == "1"
+
+# USD per 1M tokens, defaults are gpt-4o-mini list prices
+PRICE_INPUT_PER_1M = float(os.getenv("PRICE_INPUT_PER_1M", "0.15"))
+PRICE_OUTPUT_PER_1M = float(os.getenv("PRICE_OUTPUT_PER_1M", "0.60"))
+
+# Payload and metric lines go through their own logger, opened up when either flag is on,
+# so they are emitted even though the root logger stays at WARNING
+logger = logging.getLogger("metrics")
+if METRICS_LOG or DEBUG_PAYLOAD_SAMPLE_RATE > 0:
+    logger.setLevel(logging.DEBUG)
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+COUNTERS = (
+    "bytes_downloaded", "pages_fetched", "truncated_pages", "skipped_pages",
+    "prompt_tokens", "completion_tokens", "llm_calls",
+)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Totals of one pipeline stage within a request."""
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_s = 0.0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    @property
+    def cost_usd(self):
+        return (self.counters["prompt_tokens"] * PRICE_INPUT_PER_1M
+                + self.counters["completion_tokens"] * PRICE_OUTPUT_PER_1M) / 1e6
+
+    def to_dict(self):
+        return {"wall_s": round(self.wall_s, 4), **self.counters, "cost_usd": round(self.cost_usd, 6)}
+
+
+class RequestTrace:
+    """Per-request spans: link_discovery, ranking, fetch, clean, generate."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall_s = None
+        self.spans = {}
+        self.truncated_urls = []
+        self.sampled = random.random() < DEBUG_PAYLOAD_SAMPLE_RATE
+
+    def stage(self, name):
+        if name not in self.spans:
+            self.spans[name] = Span(name)
+        return self.spans[name]
+
+    def to_dict(self):
+        totals = Span("total")
+        for span in self.spans.values():
+            for key, value in span.counters.items():
+                totals.counters[key] += value
+        totals.wall_s = self.wall_s if self.wall_s is not None else time.perf_counter() - self.started
+        result = {
+            "spans": {name: span.to_dict() for name, span in self.spans.items()},
+            "total": totals.to_dict(),
+        }
+        if self.truncated_urls:
+            result["truncated_urls"] = list(self.truncated_urls)
+        return result
+
+
+@contextmanager
+def start_trace():
+    """Trace one request; on exit its spans go to the process-wide registry."""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.wall_s = time.perf_counter() - trace.started
+        registry.observe(trace)
+        if METRICS_LOG:
+            logger.info(json.dumps({"event": "request_metrics", **trace.to_dict()}))
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def _timed_span(trace, name):
+    span = trace.stage(name)
+    token = _current_span.set(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span.wall_s += time.perf_counter() - started
+        _current_span.reset(token)
+
+
+def span(name):
+    """Time a stage of the current request; counters added inside go to it."""
+    trace = _current_trace.get()
+    if trace is None:
+        return nullcontext()
+    return _timed_span(trace, name)
+
+
+@contextmanager
+def use_span(name):
+    """Attribute counters to a stage without timing, e.g. for tasks started early."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    token = _current_span.set(trace.stage(name))
+    try:
+        yield trace.stage(name)
+    finally:
+        _current_span.reset(token)
+
+
+def add(**counters):
+    """Add to the counters of the current span (no-op outside a trace)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    target = _current_span.get() or trace.stage("other")
+    for key, value in counters.items():
+        target.counters[key] += value
+
+
+def record_truncated(url):
+    """Note a page whose body was cut at the fetch byte cap (no-op outside a trace)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.truncated_urls.append(url)
+
+
+def record_llm_call(prompt, completion, model_name):
+    from tokens import count_tokens
+
+    if _current_trace.get() is None:
+        return
+    add(
+        llm_calls=1,
+        prompt_tokens=count_tokens(prompt, model_name),
+        completion_tokens=count_tokens(completion, model_name),
+    )
+
+
+def log_payload(label, payload):
+    """Log a full payload, only for the sampled share of requests.
+
+    Inside a trace the sampling decision is made once per request,
+    outside of one (e.g. debug.py) it is made per call.
+    """
+    trace = _current_trace.get()
+    sampled = trace.sampled if trace is not None else random.random() < DEBUG_PAYLOAD_SAMPLE_RATE
+    if sampled:
+        logger.debug(f"{label}: {payload}")
+
+
+class MetricsRegistry:
+    """Process-wide aggregates of request traces, exportable in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.stage_counters = {}
+        self.stage_buckets = {}
+        self.stage_wall = {}
+        self.gauges = {}
+
+    def observe(self, trace):
+        with self._lock:
+            self.requests += 1
+            for name, span in trace.spans.items():
+                counters = self.stage_counters.setdefault(name, dict.fromkeys(COUNTERS, 0))
+                for key, value in span.counters.items():
+                    counters[key] += value
+                buckets = self.stage_buckets.setdefault(name, [0] * (len(LATENCY_BUCKETS) + 1))
+                index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if span.wall_s <= bound), len(LATENCY_BUCKETS))
+                buckets[index] += 1
+                count, total = self.stage_wall.get(name, (0, 0.0))
+                self.stage_wall[name] = (count + 1, total + span.wall_s)
+
+    def register_gauge(self, name, read):
+        """Export `read()` as descriptions_<name> on every scrape."""
+        self.gauges[name] = read
+
+    def export_prometheus(self):
+        with self._lock:
+            lines = [
+                "# TYPE descriptions_requests_total counter",
+                f"descriptions_requests_total {self.requests}",
+                "# TYPE descriptions_stage_seconds histogram",
+            ]
+            for name, buckets in self.stage_buckets.items():
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                    cumulative += count
+                    lines.append(f'descriptions_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                count, total = self.stage_wall[name]
+                lines.append(f'descriptions_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+                lines.append(f'descriptions_stage_seconds_count{{stage="{name}"}} {count}')
+            for key in COUNTERS:
+                lines.append(f"# TYPE descriptions_{key}_total counter")
+                for name, counters in self.stage_counters.items():
+                    lines.append(f'descriptions_{key}_total{{stage="{name}"}} {counters[key]}')
+            lines.append("# TYPE descriptions_cost_usd_total counter")
+            for name, counters in self.stage_counters.items():
+                cost = (counters["prompt_tokens"] * PRICE_INPUT_PER_1M
+                        + counters["completion_tokens"] * PRICE_OUTPUT_PER_1M) / 1e6
+                lines.append(f'descriptions_cost_usd_total{{stage="{name}"}} {cost:.6f}')
+            for name, read in self.gauges.items():
+                lines.append(f"# TYPE descriptions_{name} gauge")
+                lines.append(f"descriptions_{name} {read()}")
+            return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
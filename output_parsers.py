@@ -1,10 +1,48 @@
-from typing import Dict
-from langchain_core.pydantic_v1 import BaseModel, Field
+from typing import List
+from pydantic import BaseModel, Field
 from langchain.output_parsers import PydanticOutputParser
+from link_ranker import MAX_RELEVANT_LINKS
 
-# Define the expected output model
+# Define the expected output model: numbers of the chosen links from the numbered list in the prompt
 class RelevantLinksOutput(BaseModel):
-    links: Dict[str, str] = Field(description="A dictionary with URLs as keys and 'YES' or 'NO' as values")
+    links: List[int] = Field(description="Numbers of at most 3 most relevant links from the numbered list")
 
 # Create the Pydantic output parser using the model
 relevant_links_parser = PydanticOutputParser(pydantic_object=RelevantLinksOutput)
+
+# The same shape as a plain JSON schema for native structured output; the reply then comes back as a dict
+RELEVANT_LINKS_SCHEMA = {
+    "title": "RelevantLinksOutput",
+    "description": "Numbers of the chosen links",
+    "type": "object",
+    "properties": {
+        "links": {
+            "type": "array",
+            "items": {"type": "integer"},
+            "description": RelevantLinksOutput.model_fields["links"].description,
+        },
+    },
+    "required": ["links"],
+}
+
+# Function to turn a parsed model reply (model, dict or None) into RelevantLinksOutput, None when unusable
+def as_links_output(result):
+    if isinstance(result, RelevantLinksOutput):
+        return result
+    if isinstance(result, dict) and isinstance(result.get("links"), list):
+        links = [number for number in result["links"] if isinstance(number, int) and not isinstance(number, bool)]
+        return RelevantLinksOutput(links=links)
+    return None
+
+# Function to render links as the numbered list the model answers with
+def format_numbered_links(urls):
+    return "\n".join(f"{number}. {url}" for number, url in enumerate(urls, 1))
+
+# Function to map the chosen numbers back to urls, skipping numbers outside the
+# list and repeats, and keeping at most MAX_RELEVANT_LINKS
+def links_from_numbers(links_output, urls, max_links=MAX_RELEVANT_LINKS):
+    chosen = []
+    for number in links_output.links:
+        if 1 <= number <= len(urls) and urls[number - 1] not in chosen:
+            chosen.append(urls[number - 1])
+    return chosen[:max_links]
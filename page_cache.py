@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+import httpx
+
+
+# Page cache settings, PAGE_CACHE_PATH="" disables the cache
+PAGE_CACHE_PATH = os.getenv(
+    "PAGE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "generate_descriptions_pages.sqlite")
+)
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", str(24 * 3600)))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Only headers we need to rebuild a response are stored
+STORED_HEADERS = ("content-type", "etag", "last-modified")
+
+
+class CachedPage:
+    def __init__(self, url, status, headers, body, fetched_at):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self):
+        headers = {}
+        if self.headers.get("etag"):
+            headers["If-None-Match"] = self.headers["etag"]
+        if self.headers.get("last-modified"):
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+    def to_response(self):
+        return httpx.Response(
+            self.status,
+            headers=self.headers,
+            content=self.body,
+            request=httpx.Request("GET", self.url),
+        )
+
+
+class PageCache:
+    """On-disk SQLite cache of fetched pages with TTL and size-bounded LRU eviction.
+
+    Bodies are stored zlib-compressed. Stale entries keep their validators
+    (ETag/Last-Modified) so they can be revalidated with a conditional request.
+    """
+
+    def __init__(self, path=PAGE_CACHE_PATH, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        # Running total of stored body sizes, so put() does not sum the whole table
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        status, headers, body, fetched_at = row
+        return CachedPage(url, status, json.loads(headers), zlib.decompress(body), fetched_at)
+
+    def put(self, url, response):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        body = zlib.compress(response.content)
+        now = time.time()
+        with self._lock:
+            # A replaced page no longer counts towards the total
+            row = self._conn.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is not None:
+                self._total -= row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, response.status_code, json.dumps(headers), body, len(body), now, now),
+            )
+            self._total += len(body)
+            self._evict()
+
+    def refresh(self, url, response):
+        # A 304 may carry updated validators, keep the stored body
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT headers FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            headers = json.loads(row[0])
+            for name in ("etag", "last-modified"):
+                if name in response.headers:
+                    headers[name] = response.headers[name]
+            self._conn.execute(
+                "UPDATE pages SET headers = ?, fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (json.dumps(headers), now, now, url),
+            )
+
+    def _evict(self):
+        # Drop least recently used pages until we are under the limit, a few at a time
+        # through the accessed_at index instead of reading every url
+        while self._total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT url, size FROM pages ORDER BY accessed_at LIMIT 32"
+            ).fetchall()
+            if not rows:
+                # Another process emptied the table under us
+                self._total = 0
+                return
+            for url, size in rows:
+                self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self.stats["evicted"] += 1
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    return
+
+    def close(self):
+        self._conn.close()
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Return the process-wide page cache, or None when it is disabled."""
+    global _page_cache
+    if not PAGE_CACHE_PATH:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+    return _page_cache
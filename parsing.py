@@ -0,0 +1,212 @@
+import codecs
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is optional, bs4 html.parser is the fallback
+    lxml = None
+
+
+# PARSE_STATS=1 records parse time and peak memory per page (tracemalloc adds overhead,
+# and parses then run one at a time so each peak belongs to a single page)
+PARSE_STATS = os.getenv("PARSE_STATS", "0") == "1"
+
+BS4_PARSER = "lxml" if lxml is not None else "html.parser"
+
+# Only anchors and the navigation containers they may sit in are parsed for link discovery
+LINK_STRAINER = SoupStrainer(["a", "nav", "header"])
+
+# Elements that never hold page content
+DROPPED_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "nav", "footer")
+# Elements ending a line of text, so blocks stay separated like with get_text()
+BLOCK_TAGS = (
+    "p", "div", "section", "article", "main", "header", "aside", "li", "ul", "ol", "table", "tr",
+    "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "br", "dd", "dt", "blockquote", "pre",
+)
+# A <main> (or all <article>s together) with less text than this is ignored and the whole body is used
+MIN_MAIN_TEXT = 200
+
+# Pages with less visible text than this are rendered in a browser
+MIN_STATIC_TEXT = int(os.getenv("MIN_STATIC_TEXT", "300"))
+# Below this even a page without SPA markers is rendered
+MIN_ANY_TEXT = 50
+_invisible_pattern = re.compile(rb'<(script|style|noscript|template)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_tag_pattern = re.compile(rb'<[^>]*>')
+# lxml refuses str input that still carries an encoding declaration
+_xml_declaration = re.compile(r'^\s*<\?xml[^>]*\?>')
+_boms = (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+_spa_markers = re.compile(
+    (
+        r'<div[^>]+id=["\'](?:root|app|__next|__nuxt|q-app)["\'][^>]*>\s*</div>'
+        r'|ng-version=|data-reactroot|enable javascript|włącz javascript|wlacz javascript'
+    ).encode("utf-8"),
+    re.IGNORECASE,
+)
+
+
+# tracemalloc is process-wide, measured parses hold this so no other parse resets its peak
+_tracing_lock = threading.Lock()
+
+
+class ParseStats:
+    """Time and peak memory of one parse, appended to `stats` when given.
+
+    peak_bytes is the process's traced peak during the parse: other parses
+    are kept out by _tracing_lock, allocations of unrelated threads are not.
+    """
+
+    def __init__(self, stats, url, kind):
+        self.stats = stats
+        self.url = url
+        self.kind = kind
+
+    def __enter__(self):
+        if self.stats is None:
+            return self
+        self.measuring = PARSE_STATS or tracemalloc.is_tracing()
+        if self.measuring:
+            _tracing_lock.acquire()
+            self.tracing = not tracemalloc.is_tracing()
+            if self.tracing:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.stats is None:
+            return False
+        entry = {"url": self.url, "kind": self.kind, "parse_s": round(time.perf_counter() - self.started, 4)}
+        if self.measuring:
+            entry["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            if self.tracing:
+                tracemalloc.stop()
+            _tracing_lock.release()
+        self.stats.append(entry)
+        return False
+
+
+def decode_html(content, encoding=None):
+    """Decode an HTML body: a BOM wins, then the HTTP charset, then <meta charset> or a guess.
+
+    `encoding` is the charset of the Content-Type header, if any. Bytes cut
+    off mid-character (a truncated body) are replaced, not an error.
+    """
+    if isinstance(content, str):
+        return content
+    if encoding and not content.startswith(_boms):
+        try:
+            return content.decode(codecs.lookup(encoding).name, "replace")
+        except LookupError:
+            pass
+    markup = UnicodeDammit(content, is_html=True).unicode_markup
+    return markup if markup is not None else content.decode("utf-8", "replace")
+
+
+def needs_rendering(content):
+    """Guess from static HTML whether the page only gets its text from JavaScript.
+
+    A cheap regex pass, no DOM is built: true when the visible text is
+    tiny, or short with a single-page-app marker.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8", "ignore")
+    text = _tag_pattern.sub(b" ", _invisible_pattern.sub(b" ", content))
+    text_length = len(b"".join(text.split()))
+    if text_length < MIN_ANY_TEXT:
+        return True
+    return text_length < MIN_STATIC_TEXT and _spa_markers.search(content) is not None
+
+
+def parse_links(content, url=None, stats=None):
+    """Parse only <a> tags (and their nav/header containers) for link discovery.
+
+    Returns (href, text, in_nav, hreflang) tuples in page order, plain data
+    so the parse can run in a worker process.
+    """
+    with ParseStats(stats, url, "links"):
+        soup = BeautifulSoup(content, BS4_PARSER, parse_only=LINK_STRAINER)
+        return [
+            (a.get("href"), a.get_text(" ", strip=True), a.find_parent(["nav", "header"]) is not None, a.get("hreflang"))
+            for a in soup.find_all("a", href=True)
+        ]
+
+
+def parse_links_with_stats(content, url=None):
+    """Like parse_links, but return (links, stats) so it can run in a worker process."""
+    stats = []
+    links = parse_links(content, url, stats)
+    return links, stats
+
+
+def extract_main_text(content, url=None, stats=None):
+    """Return the readable text of a page without scripts, styles, nav and footer."""
+    with ParseStats(stats, url, "content"):
+        # Bytes would be read as Latin-1 by lxml when the page declares no charset
+        content = decode_html(content)
+        if lxml is None:
+            return _extract_main_text_bs4(content)
+        return _extract_main_text_lxml(content)
+
+
+def extract_main_text_with_stats(content, url=None):
+    """Like extract_main_text, but return (text, stats) so it can run in a worker process."""
+    stats = []
+    text = extract_main_text(content, url, stats)
+    return text, stats
+
+
+def _extract_main_text_lxml(content):
+    if isinstance(content, str):
+        content = _xml_declaration.sub("", content, count=1)
+    try:
+        root = lxml.html.document_fromstring(content)
+    except (etree.ParserError, ValueError):
+        return ""
+    etree.strip_elements(root, *DROPPED_TAGS, etree.Comment, with_tail=False)
+
+    for element in root.iter(*BLOCK_TAGS):
+        element.tail = "\n" + element.tail if element.tail else "\n"
+
+    nodes = _main_nodes(
+        root.iter("main"),
+        [a for a in root.iter("article") if not any(p.tag == "article" for p in a.iterancestors())],
+        lambda node: node.text_content(),
+    )
+    if nodes is None:
+        body = root.find("body")
+        nodes = [body if body is not None else root]
+    return "\n".join(node.text_content() for node in nodes)
+
+
+def _main_nodes(mains, articles, text_of):
+    """Pick the content nodes: the first <main> with enough text, else every outermost
+    <article> together (offer and product lists are several), else None for the body."""
+    for main in mains:
+        if len(text_of(main).strip()) >= MIN_MAIN_TEXT:
+            return [main]
+    if sum(len(text_of(article).strip()) for article in articles) >= MIN_MAIN_TEXT:
+        return articles
+    return None
+
+
+def _extract_main_text_bs4(content):
+    soup = BeautifulSoup(content, "html.parser")
+    for element in soup(DROPPED_TAGS):
+        element.decompose()
+    nodes = _main_nodes(
+        soup.find_all("main"),
+        [a for a in soup.find_all("article") if a.find_parent("article") is None],
+        lambda node: node.get_text(),
+    )
+    if nodes is None:
+        nodes = [soup.body or soup]
+    return "\n".join(node.get_text("\n") for node in nodes)
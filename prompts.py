@@ -0,0 +1,83 @@
+# Prompt templates used by the LLM stages in main.py
+
+GET_RELEVANT_LINKS_TEMPLATE = """
+    # Kontekst
+    Jeteś asystentem którego zadaniem jest jak najlepszy wybór linków ze strony firmy pod kątem istotności znajdujących się informacji pod tymi linkami w kontekście stworzenia opisu firmy.
+    # Zadanie
+    Na podstawie podanych linków, wybierz te, pod którymi, z największym prawdopodobieństwem znajdują się istotne informacje do stworzenia opisu firmy.
+    Aby lepiej wybrać linki przeanalizuj kryteria opisu firmy, które będą używanie do stworzenia takiego opisu.
+    # Kryteria opisu
+    - Opis powinien być zwięzły, więc nie jest konieczne wybieranie wszystkich linków, a jedynie te, które zawierają najważniejsze informacje.
+    - Opis powinien zawierać informacje o firmie, takie jak:
+        - Co firma oferuje, czy sprzedaje produkty, czy usługi, czy jest dystrybutorem?
+        - W jakiej branży działa firma?
+    # Podsumowanie
+    Głównie zwracaj uwagę na zakładki typu 'o nas', 'produkty, 'usługi', 'kontakt'
+    Unikaj wybierania linków do blogów, artykułów, publikacji, itp.
+    Wybrane przez Ciebie linki będą programistycznie scrapowane, a ich zawartość będzie użyta do stworzenia opisu firmy. Dlatego ważne jest abyś zawsze wybierał linki zgodnie z kryteriami.
+    Linki (ponumerowane):
+    {urls}
+    # Odpowiedź
+    Podaj JEDYNIE numery wybranych linków z powyższej listy, nie przepisuj samych linków.
+    Maksymalnie wybierz 3 najistotniejsze linki, ponieważ są one scrapowane i naszym celem jest uniknięcie zbyt dużej ilości niepotrzebnych informacji.
+    NIE możesz wybrać więcej niż 3 linków. Wybierz naistotniejsze pod względem kryteriów.
+    Nie dodawaj żadnych dodatkowych informacji.
+    Teraz przeanalizuj podane informacje i wybierz numery linków.
+    \n{format_instructions}
+    """
+
+GENERATE_DESCRIPTION_TEMPLATE = """
+    # Kontekst
+    Jesteś asystentem którego zadaniem jest generowanie opisu firmy na podstawie danych zebranych ze stron internetowych.
+    Otrzymasz dane zescrapowane ze stron internetowych, na podstawie których powinieneś stworzyć opis firmy.
+    Dane te zawierają informacje o firmie, jej produktach, usługach, branży, itp.
+    Mogą to być dane w różnych językach jednak twoim zadaniem jest zawsze stworzenie opisu w języku Polskim.
+    # Zadanie
+    Stwórz opis firmy na podstawie podanych danych. Zgodnie z podanymi poniżej kryteriami.
+    # Kryteria opisu
+    - Opis powinien być zwięzły, ale zawierać wszystkie informacje o firmie określone w kryteriach opisu.
+    - Opis powinien być w pełni oparty na podstawie podanych danych. Nie dodawaj własnych informacji. Jeśli jakiś informacji nie ma w podanych danych, nie podawaj ich w opisie.
+    - Opis powinien być w języku Polskim.
+    - Opis powinien być podzielony na dwie sekcje i zawierać informacje takie jak:
+    SEKCJA 1: Profil funkcjonalny firmy
+        - Co firma jest producentem, dystrybutorem czy usługodawcą.
+        - Zwracaj uwagę czy wskazana spółka posiada jakieś unikalne aktywa, jeżeli będą takie informacje na jej stronie internetowej, np. jest właścicielem znaków towarowych, patentów, unikalnych linii produkcyjnych itp.
+        - Zwracaj uwagę czy firma prezentuje informacje o kanałach dystrybucji jakie stosuje albo jakiego rodzaju klientów obsługuje i w jakiej formule.
+        - Zwracaj uwagę jak kompleksowy jest jej profil funkcjonalny np. czy jest producentem kontraktowym, który wytwarza produkty według receptur i pod brandem zleceniodawców, czy też ma swoje własne receptury, własne brandy i samodzielnie sprzedaje produkty poprzez własne sklepy stacjonarne.
+        - Uwzględnij również informację czy nie jest podmiotem działającym w ramach grupy kapitałowej i czy nie ma podmiotów powiązanych, jeżeli informacje na jej stronie internetowej będą na to wskazywać.
+    SEKCJA 2: Oferta produktowa/usługowa
+        - Przedstaw pełną listę produktów / usług oferowanych przez spółkę.
+
+    Opis powinienen być szczegółowy, wyczerpujący i zawierać wszystkie informacje,
+    które uda się odnaleźć w podanych poniżej danych. Pomijaj w opisach informacje
+    dotyczące historii działalności spółki, kto ją założył, doświadczenia spółki, uzyskanych
+    nagród, cen produktów, dokładnej charakterystyki, składu czy zastosowania
+    produktów.
+    # Dane
+    Dane: {cleaned_data}
+    # Odpowiedź
+    W odpowiedzi nie używaj zwrotów typu, "oto odpowiedź", tylko odrazu podawaj opis. Nie dodawaj żadnych dodatkowych informacji, podaj JEDYNIE opis firmy zgodny z kryteriami.
+    ## Przykładowy opis(SEKCJA 1 + SEKCJA 2)
+    Darco Sp. z o.o. to jedna z wiodących firm w Polsce w branży instalacyjnej, specjalizująca się w produkcji systemów wentylacyjnych, kominowych oraz dystrybucji gorącego powietrza. Firma została założona w 1992 roku i od tego czasu dynamicznie rozwija swoją ofertę, obejmującą nowoczesne rozwiązania do wentylacji i ogrzewania. Darco prowadzi także działalność badawczo-rozwojową, posiada własne laboratoria oraz oferuje usługi technicznego doradztwa i kooperacji produkcyjnej.
+    Oferta Darco obejmuje szeroką gamę produktów, w tym systemy wentylacyjne, nasady kominowe, systemy dystrybucji gorącego powietrza, rury kominowe oraz różnorodne akcesoria związane z instalacjami wentylacyjnymi i kominowymi. Firma specjalizuje się również w produkcji systemów hybrydowej wentylacji, które są stosowane w budynkach mieszkalnych i przemysłowych. Darco kładzie duży nacisk na jakość swoich produktów oraz ich innowacyjność, co pozwala na spełnienie najwyższych standardów rynkowych.
+    # Podsumowanie
+    Ten opis jest bardzo ważny dla firmy, ponieważ będzie on wykorzystany do stworzenia opisu firmy na stronie internetowej. Dlatego ważne jest, aby opis był zgodny z podanymi kryteriami i zawierał wszystkie informacje z podanych danych.
+    Jest on również bardzo ważny dla mojej kariery zawodowej, moje życie zależy od tego, czy będę w stanie stworzyć ten opis. Dlatego poświęć na to zadanie dużo uwagi i staraj się jak najlepiej spełnić podane kryteria.
+    """
+
+SUMMARIZE_CHUNK_TEMPLATE = """
+    # Kontekst
+    Jesteś asystentem, który przygotowuje notatki do opisu firmy. Otrzymasz fragment danych zescrapowanych ze strony internetowej firmy.
+    Dane mogą być w różnych językach, notatki zawsze przygotuj w języku Polskim.
+    # Zadanie
+    Wypisz zwięźle wszystkie informacje z fragmentu, które są istotne dla opisu firmy:
+        - czy firma jest producentem, dystrybutorem czy usługodawcą,
+        - unikalne aktywa (znaki towarowe, patenty, linie produkcyjne),
+        - kanały dystrybucji i rodzaje obsługiwanych klientów,
+        - przynależność do grupy kapitałowej i podmioty powiązane,
+        - pełna lista produktów i usług.
+    Nie dodawaj własnych informacji. Jeśli fragment nie zawiera istotnych informacji, odpowiedz pustym tekstem.
+    Zachowaj oznaczenia źródła (Source), NIP i REGON, jeśli występują.
+    # Fragment
+    {chunk}
+    """
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts of up to `capacity`.
+
+    Waiters are served in arrival order, `waited_s` adds up the time they
+    spent throttled.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited_s = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens=1):
+        """Seconds until `tokens` are available, 0 when they are now."""
+        self._refill()
+        tokens = min(tokens, self.capacity)
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def take(self, tokens=1):
+        """Take tokens without waiting, the balance may go negative (a debt later calls wait off)."""
+        self._refill()
+        self.tokens -= tokens
+
+    def give_back(self, tokens):
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    async def acquire(self, tokens=1):
+        # More than a full bucket could never be granted, so it just waits for a full one
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                delay = (tokens - self.tokens) / self.rate
+                self.waited_s += delay
+                await asyncio.sleep(delay)
@@ -0,0 +1,308 @@
+"""REGON/NIP validation and company registry lookups for the verification step.
+
+The local backend reads an index built once from a registry bulk dump
+(CSV with regon, nip and name columns):
+
+    python registry.py build dump.csv registry.idx
+
+The index is an open-addressing hash table keyed by REGON and stored in a
+file that is memory-mapped, so a lookup is a few page reads with nothing
+loaded up front. Without an index, lookups can go to a remote backend
+(REGISTRY_API_URL) instead, and tests can install any object with an
+async lookup(regon) through use_registry().
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+
+# REGISTRY_INDEX_PATH selects the local index, REGISTRY_API_URL the remote backend
+REGISTRY_INDEX_PATH = os.getenv("REGISTRY_INDEX_PATH", "")
+REGISTRY_API_URL = os.getenv("REGISTRY_API_URL", "")
+
+REGON9_WEIGHTS = (8, 9, 2, 3, 4, 5, 6, 7)
+REGON14_WEIGHTS = (2, 4, 8, 5, 0, 9, 7, 3, 6, 1, 2, 4, 8)
+NIP_WEIGHTS = (6, 5, 7, 2, 3, 4, 5, 6, 7)
+
+# Identifiers as pages print them: "NIP: PL 123-456-32-18", "REGON 123456785"
+_tag_pattern = re.compile(r'<[^>]+>')
+_nip_pattern = re.compile(r'\bNIP\b\W{0,5}(?:PL\s?)?(\d(?:[\s-]?\d){9})\b', re.IGNORECASE)
+_regon_pattern = re.compile(r'\bREGON\b\W{0,5}(\d{14}|\d{9})\b', re.IGNORECASE)
+
+
+def normalize_number(value):
+    """Keep only the digits of an identifier, None when nothing is left."""
+    digits = re.sub(r'\D', '', str(value or ''))
+    return digits or None
+
+
+def _check_digit(digits, weights):
+    return sum(int(d) * w for d, w in zip(digits, weights)) % 11
+
+
+def regon_is_valid(regon):
+    """Validate the check digit of a 9- or 14-digit REGON."""
+    regon = normalize_number(regon)
+    if regon is None or len(regon) not in (9, 14) or int(regon) == 0:
+        return False
+    weights = REGON9_WEIGHTS if len(regon) == 9 else REGON14_WEIGHTS
+    return _check_digit(regon, weights) % 10 == int(regon[-1])
+
+
+def nip_is_valid(nip):
+    """Validate the check digit of a 10-digit NIP (a remainder of 10 is never valid)."""
+    nip = normalize_number(nip)
+    if nip is None or len(nip) != 10:
+        return False
+    check = _check_digit(nip, NIP_WEIGHTS)
+    return check != 10 and check == int(nip[-1])
+
+
+def find_identifiers(text):
+    """Return {"nip": set, "regon": set} of the valid identifiers printed in text or HTML."""
+    if isinstance(text, bytes):
+        text = text.decode("utf-8", "ignore")
+    text = _tag_pattern.sub(' ', text)
+    return {
+        "nip": {n for n in map(normalize_number, _nip_pattern.findall(text)) if nip_is_valid(n)},
+        "regon": {r for r in _regon_pattern.findall(text) if regon_is_valid(r)},
+    }
+
+
+def merge_identifiers(target, found):
+    for key, values in found.items():
+        target.setdefault(key, set()).update(values)
+    return target
+
+
+@dataclass
+class RegistryEntry:
+    regon: str
+    nip: Optional[str]
+    name: str
+
+
+class RegistryIndex:
+    """Read-only view of an index file written by build_index()."""
+
+    MAGIC = b"REGIDX1\0"
+    HEADER = struct.Struct("<8sQQQ")  # magic, slot count, record count, names offset
+    SLOT = struct.Struct("<QQIH2x")  # regon, nip, name offset, name length
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.slot_count, self.record_count, self.names_offset = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} is not a registry index")
+        self._mask = self.slot_count - 1
+
+    def get(self, regon):
+        regon = normalize_number(regon)
+        if regon is None:
+            return None
+        key = int(regon)
+        slot = _slot_hash(key) & self._mask
+        while True:
+            stored, nip, name_offset, name_length = self.SLOT.unpack_from(
+                self._map, self.HEADER.size + slot * self.SLOT.size
+            )
+            if stored == 0:
+                return None
+            if stored == key:
+                start = self.names_offset + name_offset
+                return RegistryEntry(
+                    regon=regon,
+                    nip=f"{nip:010d}" if nip else None,
+                    name=self._map[start:start + name_length].decode("utf-8"),
+                )
+            slot = (slot + 1) & self._mask
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _slot_hash(key):
+    # Fibonacci hashing spreads sequential REGONs over the table
+    return (key * 0x9E3779B97F4A7C15) >> 32 & 0xFFFFFFFF
+
+
+def _dump_rows(dump_path):
+    with open(dump_path, encoding="utf-8", newline="") as f:
+        for record in csv.DictReader(f):
+            regon = normalize_number(record.get("regon"))
+            if not regon_is_valid(regon):
+                continue
+            nip = normalize_number(record.get("nip"))
+            yield int(regon), int(nip) if nip_is_valid(nip) else 0, (record.get("name") or "").strip()
+
+
+def build_index(dump_path, index_path):
+    """Build an index from a CSV dump in two streaming passes; returns the record count."""
+    record_count = sum(1 for _ in _dump_rows(dump_path))
+    # Power of two at least twice the records keeps probe chains short
+    slot_count = 1 << max(4, (record_count * 2 - 1).bit_length())
+    slots_size = RegistryIndex.HEADER.size + slot_count * RegistryIndex.SLOT.size
+    mask = slot_count - 1
+
+    with open(index_path, "w+b") as f, tempfile.TemporaryFile() as names:
+        f.truncate(slots_size)
+        with mmap.mmap(f.fileno(), slots_size) as table:
+            RegistryIndex.HEADER.pack_into(table, 0, RegistryIndex.MAGIC, slot_count, record_count, slots_size)
+            name_offset = 0
+            for regon, nip, name in _dump_rows(dump_path):
+                encoded = name.encode("utf-8")[:0xFFFF]
+                slot = _slot_hash(regon) & mask
+                while True:
+                    offset = RegistryIndex.HEADER.size + slot * RegistryIndex.SLOT.size
+                    stored = struct.unpack_from("<Q", table, offset)[0]
+                    if stored in (0, regon):
+                        break
+                    slot = (slot + 1) & mask
+                RegistryIndex.SLOT.pack_into(table, offset, regon, nip, name_offset, len(encoded))
+                names.write(encoded)
+                name_offset += len(encoded)
+            table.flush()
+        names.seek(0)
+        f.seek(slots_size)
+        shutil.copyfileobj(names, f)
+    return record_count
+
+
+class LocalRegistry:
+    """Registry backend over a memory-mapped RegistryIndex."""
+
+    def __init__(self, index_path=REGISTRY_INDEX_PATH):
+        self.index = RegistryIndex(index_path)
+
+    async def lookup(self, regon):
+        return self.index.get(regon)
+
+
+class RemoteRegistry:
+    """Registry backend over an HTTP API answering GET {base_url}/{regon} with JSON.
+
+    Responses go through the shared fetcher, so they are pooled, retried and cached.
+    """
+
+    def __init__(self, base_url=REGISTRY_API_URL):
+        self.base_url = base_url.rstrip("/")
+
+    async def lookup(self, regon):
+        from fetcher import get_fetcher
+
+        response = await get_fetcher().fetch(
+            f"{self.base_url}/{normalize_number(regon)}", content_types=("application/json",)
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = response.json()
+        return RegistryEntry(
+            regon=normalize_number(data.get("regon")) or normalize_number(regon),
+            nip=normalize_number(data.get("nip")),
+            name=data.get("name") or "",
+        )
+
+
+_registry = None
+_registry_loaded = False
+
+
+def use_registry(backend):
+    """Install a registry backend (None turns registry lookups off)."""
+    global _registry, _registry_loaded
+    _registry = backend
+    _registry_loaded = True
+
+
+def get_registry():
+    """Return the configured registry backend, or None when there is none."""
+    global _registry, _registry_loaded
+    if not _registry_loaded:
+        if REGISTRY_INDEX_PATH:
+            _registry = LocalRegistry()
+        elif REGISTRY_API_URL:
+            _registry = RemoteRegistry()
+        _registry_loaded = True
+    return _registry
+
+
+async def verify_regon(regon, identifiers, registry=None):
+    """Check the requested REGON against the identifiers found on the company's pages.
+
+    Status is "invalid" (bad check digit), "verified" (the site shows the
+    REGON, or the NIP the registry has for it), "mismatch" (the site shows
+    only other identifiers) or "unverified" (nothing to compare with).
+    """
+    regon = normalize_number(regon)
+    site_regons = identifiers.get("regon", set())
+    site_nips = identifiers.get("nip", set())
+    result = {
+        "regon": regon,
+        "regon_valid": regon_is_valid(regon),
+        "site": {"regon": sorted(site_regons), "nip": sorted(site_nips)},
+    }
+    if not result["regon_valid"]:
+        result["status"] = "invalid"
+        return result
+
+    # Local units have 14-digit REGONs starting with their company's 9 digits
+    on_site = any(r == regon or r[:9] == regon[:9] for r in site_regons)
+
+    registry = registry if registry is not None else get_registry()
+    entry = None
+    if registry is not None:
+        try:
+            entry = await registry.lookup(regon)
+            if entry is None and len(regon) == 14:
+                entry = await registry.lookup(regon[:9])
+        except Exception as e:
+            logging.warning(f"Registry lookup failed for {regon}: {type(e).__name__}: {e}")
+            result["registry_error"] = f"{type(e).__name__}: {e}"
+        result["registry"] = {"found": entry is not None}
+        if entry is not None:
+            result["registry"].update(nip=entry.nip, name=entry.name)
+
+    nip_on_site = entry is not None and entry.nip is not None and entry.nip in site_nips
+    if on_site or nip_on_site:
+        result["status"] = "verified"
+    elif site_regons or site_nips:
+        result["status"] = "mismatch"
+    else:
+        result["status"] = "unverified"
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build an index from a CSV dump (regon, nip, name)")
+    build.add_argument("dump")
+    build.add_argument("index")
+    lookup = commands.add_parser("lookup", help="look REGONs up in an index")
+    lookup.add_argument("index")
+    lookup.add_argument("regons", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_index(args.dump, args.index)
+        print(f"Indexed {count} entities into {args.index}")
+    else:
+        registry = LocalRegistry(args.index)
+        for regon in args.regons:
+            print(regon, asyncio.run(registry.lookup(regon)))
+
+
+if __name__ == "__main__":
+    main_cli()
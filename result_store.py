@@ -0,0 +1,88 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+# Result store settings, RESULT_STORE_PATH="" disables it
+RESULT_STORE_PATH = os.getenv(
+    "RESULT_STORE_PATH", os.path.join(tempfile.gettempdir(), "generate_descriptions_results.sqlite")
+)
+
+
+def site_fingerprint(cleaned_text, *parts):
+    """Content hash of a company's cleaned site text.
+
+    `parts` (model name, prompt template, ...) are hashed in too, so a new
+    model or prompt counts as a change.
+    """
+    digest = hashlib.sha256()
+    for part in (*parts, cleaned_text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultStore:
+    """SQLite store of the last description per (strona_www, regon) and its input fingerprint."""
+
+    def __init__(self, path=RESULT_STORE_PATH):
+        self.stats = {"unchanged": 0, "changed": 0, "new": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                strona_www TEXT NOT NULL,
+                regon TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                description TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (strona_www, regon)
+            )
+            """
+        )
+
+    def lookup(self, strona_www, regon, fingerprint):
+        """Return the stored description when its fingerprint matches, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, description FROM results WHERE strona_www = ? AND regon = ?",
+                (strona_www, regon or ""),
+            ).fetchone()
+            if row is None:
+                self.stats["new"] += 1
+                return None
+            if row[0] != fingerprint:
+                self.stats["changed"] += 1
+                return None
+            self.stats["unchanged"] += 1
+        return row[1]
+
+    def put(self, strona_www, regon, fingerprint, description):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (strona_www, regon or "", fingerprint, description, time.time()),
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+_result_store = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store():
+    """Return the process-wide result store, or None when it is disabled."""
+    global _result_store
+    if not RESULT_STORE_PATH:
+        return None
+    with _result_store_lock:
+        if _result_store is None:
+            _result_store = ResultStore()
+    return _result_store
@@ -0,0 +1,215 @@
+"""Batched writeback of descriptions to the source Google Sheet.
+
+Results are queued by sheet `row` and written with values:batchUpdate.
+Adjacent rows are merged into one range, a batch is flushed once
+SHEETS_FLUSH_ROWS rows are queued or SHEETS_FLUSH_INTERVAL seconds have
+passed, and requests go through a token bucket sized to the Sheets write
+quota. Every update overwrites fixed cells, so a retried batch never
+writes anything twice.
+
+SHEETS_API_URL can point at a local fake of the Sheets API, which then
+needs no credentials.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import weakref
+
+import httpx
+
+from rate_limit import TokenBucket
+
+
+# Writeback is on when a spreadsheet is configured
+SHEETS_SPREADSHEET_ID = os.getenv("SHEETS_SPREADSHEET_ID", "")
+SHEETS_API_URL = os.getenv("SHEETS_API_URL", "https://sheets.googleapis.com/v4")
+SHEETS_ACCESS_TOKEN = os.getenv("SHEETS_ACCESS_TOKEN", "")
+SHEETS_SHEET_NAME = os.getenv("SHEETS_SHEET_NAME", "Arkusz1")
+SHEETS_DESCRIPTION_COLUMN = os.getenv("SHEETS_DESCRIPTION_COLUMN", "D")
+# Optional column for the REGON verification status
+SHEETS_VERIFICATION_COLUMN = os.getenv("SHEETS_VERIFICATION_COLUMN", "")
+SHEETS_FLUSH_ROWS = int(os.getenv("SHEETS_FLUSH_ROWS", "200"))
+SHEETS_FLUSH_INTERVAL = float(os.getenv("SHEETS_FLUSH_INTERVAL", "10"))
+# The Sheets API allows 60 write requests per minute per user
+SHEETS_WRITES_PER_MINUTE = float(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "1"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+
+def row_number(row):
+    """Return `row` as a sheet row number, or None when it is not one."""
+    if isinstance(row, bool):
+        return None
+    if isinstance(row, int):
+        return row if row > 0 else None
+    if isinstance(row, str) and row.strip().isdigit():
+        return int(row.strip()) or None
+    return None
+
+
+def _a1_range(sheet_name, column, first_row, last_row):
+    sheet = "'" + sheet_name.replace("'", "''") + "'"
+    return f"{sheet}!{column}{first_row}:{column}{last_row}"
+
+
+def _row_runs(rows):
+    """Split sorted row numbers into runs of adjacent rows."""
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][-1] + 1:
+            runs[-1].append(row)
+        else:
+            runs.append([row])
+    return runs
+
+
+class SheetsWriter:
+    """Coalesces per-row results into rate-limited, retried batch updates."""
+
+    def __init__(self, spreadsheet_id=SHEETS_SPREADSHEET_ID, base_url=SHEETS_API_URL,
+                 flush_rows=SHEETS_FLUSH_ROWS, flush_interval=SHEETS_FLUSH_INTERVAL,
+                 writes_per_minute=SHEETS_WRITES_PER_MINUTE):
+        self.spreadsheet_id = spreadsheet_id
+        self.base_url = base_url.rstrip("/")
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.columns = {"description": SHEETS_DESCRIPTION_COLUMN}
+        if SHEETS_VERIFICATION_COLUMN:
+            self.columns["verification"] = SHEETS_VERIFICATION_COLUMN
+        self.stats = {"queued": 0, "written_rows": 0, "requests": 0, "retries": 0, "failed_batches": 0}
+        self._pending = {}
+        self._bucket = TokenBucket(writes_per_minute / 60, capacity=max(1.0, writes_per_minute / 10))
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher = None
+        self._credentials = None
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(30, connect=5))
+
+    def add(self, row, result):
+        """Queue the result of one sheet row; a newer result for the same row replaces it."""
+        row = row_number(row)
+        if row is None or "description" not in result:
+            return
+        values = {"description": result["description"]}
+        if "verification" in self.columns and "regon_verification" in result:
+            values["verification"] = result["regon_verification"]["status"]
+        self._pending[row] = values
+        self.stats["queued"] += 1
+
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically())
+        if len(self._pending) >= self.flush_rows:
+            self._wakeup.set()
+
+    async def _flush_periodically(self):
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything queued so far, in batches of at most flush_rows rows."""
+        async with self._flush_lock:
+            while self._pending:
+                rows = sorted(self._pending)[:self.flush_rows]
+                batch = {row: self._pending.pop(row) for row in rows}
+                if not await self._write(batch):
+                    # Retries ran out; put the batch back unless a newer result arrived meanwhile
+                    for row, values in batch.items():
+                        self._pending.setdefault(row, values)
+                    return False
+        return True
+
+    def _batch_body(self, batch):
+        data = []
+        for field, column in self.columns.items():
+            rows = sorted(row for row, values in batch.items() if field in values)
+            for run in _row_runs(rows):
+                data.append({
+                    "range": _a1_range(SHEETS_SHEET_NAME, column, run[0], run[-1]),
+                    "majorDimension": "ROWS",
+                    "values": [[batch[row][field]] for row in run],
+                })
+        return {"valueInputOption": "RAW", "data": data}
+
+    async def _write(self, batch):
+        """Send one batch, False when it should be tried again later.
+
+        Errors that retrying cannot fix (bad range, no access) drop the batch.
+        """
+        url = f"{self.base_url}/spreadsheets/{self.spreadsheet_id}/values:batchUpdate"
+        body = self._batch_body(batch)
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            self.stats["requests"] += 1
+            try:
+                response = await self._client.post(url, json=body, headers=await self._auth_headers())
+                if response.status_code < 300:
+                    self.stats["written_rows"] += len(batch)
+                    return True
+                retryable = response.status_code in RETRY_STATUSES
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+            except httpx.TransportError as e:
+                retryable = True
+                error = f"{type(e).__name__}: {e}"
+
+            if not retryable:
+                self.stats["failed_batches"] += 1
+                logging.error(f"Sheets writeback of {len(batch)} rows dropped: {error}")
+                return True
+            if attempt >= SHEETS_MAX_RETRIES:
+                logging.error(f"Sheets writeback of {len(batch)} rows failed, keeping them queued: {error}")
+                return False
+            attempt += 1
+            self.stats["retries"] += 1
+            delay = SHEETS_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+            logging.warning(f"Sheets writeback failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _auth_headers(self):
+        if SHEETS_ACCESS_TOKEN:
+            return {"Authorization": f"Bearer {SHEETS_ACCESS_TOKEN}"}
+        if not re.match(r"https://[^/]*googleapis\.com", self.base_url):
+            # A local fake of the API does not check credentials
+            return {}
+        if self._credentials is None:
+            import google.auth
+
+            self._credentials, _ = google.auth.default(scopes=SCOPES)
+        if not self._credentials.valid:
+            from google.auth.transport.requests import Request
+
+            await asyncio.to_thread(self._credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self._credentials.token}"}
+
+    async def aclose(self):
+        """Flush what is left and close the HTTP client."""
+        await self.flush()
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await self._client.aclose()
+
+
+# One writer per event loop, like the fetcher
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_sheets_writer():
+    """Return the writer of the running loop, or None when writeback is off."""
+    if not SHEETS_SPREADSHEET_ID:
+        return None
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = SheetsWriter()
+        _writers[loop] = writer
+    return writer
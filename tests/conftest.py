@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The modules live at the repository root, like for the benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Set before anything is imported: no on-disk caches, no browser, calls straight to the (fake) API
+os.environ["PAGE_CACHE_PATH"] = ""
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ["RESULT_STORE_PATH"] = ""
+os.environ["RENDER_JS"] = "0"
+os.environ["LLM_SCHEDULER"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,12 @@
+from cleaning import clean_page
+
+
+def test_only_valid_identifiers_are_appended():
+    text = clean_page("Firma ABC. NIP 123-456-32-19 REGON 123456786. Adres: NIP 123-456-32-18, REGON 123456785")
+
+    assert text.endswith("\nNIP: NIP 123-456-32-18\nREGON: REGON 123456785")
+    assert "32-19" not in text.split("\n", 1)[1]
+
+
+def test_invalid_identifiers_alone_append_nothing():
+    assert "\n" not in clean_page("Firma ABC. NIP 123-456-32-19 REGON 123456786")
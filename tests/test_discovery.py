@@ -0,0 +1,91 @@
+"""Sitemap discovery and its time limit, against a local site."""
+import asyncio
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from discovery import discover_sitemap_links, parse_sitemap  # noqa: E402
+
+
+def urlset(*urls):
+    entries = "".join(f"<url><loc>{url}</loc></url>" for url in urls)
+    return f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'.encode()
+
+
+def test_parse_sitemap_reads_pages_and_child_sitemaps():
+    index = (b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+             b'<sitemap><loc>https://x.pl/page-sitemap.xml</loc></sitemap></sitemapindex>')
+    pages = urlset("https://x.pl/o-nas", "https://x.pl/oferta")
+
+    assert parse_sitemap(index) == ([], ["https://x.pl/page-sitemap.xml"])
+    assert parse_sitemap(gzip.compress(pages)) == (["https://x.pl/o-nas", "https://x.pl/oferta"], [])
+    assert parse_sitemap(pages, max_urls=1) == (["https://x.pl/o-nas"], [])
+
+
+def test_gzip_expansion_is_capped():
+    bomb = gzip.compress(b"<urlset><url><loc>" + b"a" * (64 * 1024 * 1024) + b"</loc></url></urlset>", 9)
+
+    assert parse_sitemap(bomb, max_decompressed=1024 * 1024) == ([], [])
+
+
+class Site:
+    """robots.txt naming a fast and a slow sitemap, plus a homepage."""
+
+    def __init__(self, slow_s):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                base = f"http://127.0.0.1:{site.server.server_port}"
+                if self.path == "/robots.txt":
+                    body, kind = (f"User-agent: *\nDisallow: /private/\n"
+                                  f"Sitemap: {base}/page-sitemap.xml\nSitemap: {base}/slow-sitemap.xml\n"
+                                  ).encode(), "text/plain"
+                elif self.path == "/page-sitemap.xml":
+                    body, kind = urlset(f"{base}/o-nas", f"{base}/private/x", f"http://www.example.com/"), "text/xml"
+                elif self.path == "/slow-sitemap.xml":
+                    time.sleep(slow_s)
+                    body, kind = urlset(f"{base}/late"), "text/xml"
+                else:
+                    body, kind = b'<html><body><a href="/kontakt">Kontakt</a>' + b"x" * 400 + b"</body></html>", "text/html"
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def site():
+    site = Site(slow_s=2)
+    yield site
+    site.server.shutdown()
+
+
+def test_discovery_honours_robots_and_stays_on_site(site):
+    links = asyncio.run(discover_sitemap_links(site.url))
+
+    assert links == [site.url + "o-nas", site.url + "late"]
+
+
+def test_slow_sitemap_keeps_what_was_found(site, monkeypatch):
+    main = pytest.importorskip("main")
+    monkeypatch.setattr(main, "DISCOVERY_TIMEOUT", 0.5)
+
+    started = time.perf_counter()
+    links = asyncio.run(main.get_all_links(site.url))
+
+    assert time.perf_counter() - started < 1.5
+    assert set(links) == {site.url + "kontakt", site.url + "o-nas"}
@@ -0,0 +1,65 @@
+import pytest
+
+from link_ranker import _keyword_score, _normalize, heuristic_relevant_links, is_confident, rank_links, score_link
+
+
+@pytest.mark.parametrize("text, score", [
+    # Negative keywords only as whole words
+    ("/research", 0),
+    ("/ochrona-srodowiska", 0),
+    ("/wspolpraca", 0),
+    ("/cartridges", 0),
+    ("/kariera/praca", -5),
+    ("/koszyk", -5),
+    ("/search", -4),
+    ("/polityka-prywatnosci", -5),
+    ("/wp-content/uploads/a.php", -5),
+    # Positive keywords also as word prefixes, multi-word ones in order
+    ("/o-nas", 5),
+    ("/o_nas.html", 5),
+    ("/onas/", 5),
+    ("o nas", 5),
+    ("/nas-o", 0),
+    ("/uslugi-remontowe", 5),
+    ("/produkty", 5),
+    ("/kim-jestesmy", 5),
+    # The best positive keyword counts once, negatives add up
+    ("/o-nas/oferta", 5),
+    ("/oferta/blog/tag", -3),
+])
+def test_keyword_score(text, score):
+    assert _keyword_score(text) == score
+
+
+@pytest.mark.parametrize("text, normalized", [
+    ("Współpraca", "wspolpraca"),
+    ("Usługi", "uslugi"),
+    ("ŁÓDŹ", "lodz"),
+    (None, ""),
+])
+def test_normalize_maps_polish_letters(text, normalized):
+    assert _normalize(text) == normalized
+
+
+def test_polish_anchor_text_matches_keywords():
+    assert score_link("https://x.pl/a", {"text": "Usługi"}) > score_link("https://x.pl/a", {"text": "Współpraca"})
+    assert score_link("https://x.pl/wspolpraca") == score_link("https://x.pl/dystrybucja")
+
+
+def test_documents_are_ranked_last():
+    assert score_link("https://x.pl/o-nas/katalog.PDF") == -10.0
+
+
+def test_rank_links_prefers_main_sections():
+    links = {
+        "https://x.pl/blog/wpis": {"text": "Wpis", "position": 0},
+        "https://x.pl/o-nas": {"text": "O nas", "position": 2, "in_nav": True},
+        "https://x.pl/oferta": {"text": "Oferta", "position": 3, "in_nav": True},
+        "https://x.pl/uslugi": {"text": "Usługi", "position": 4, "in_nav": True},
+        "https://x.pl/kontakt": {"text": "Kontakt", "position": 5, "in_nav": True},
+    }
+    ranked = rank_links(links)
+
+    assert heuristic_relevant_links(ranked) == ["https://x.pl/o-nas", "https://x.pl/oferta", "https://x.pl/uslugi"]
+    assert ranked[-1][0] == "https://x.pl/blog/wpis"
+    assert is_confident(ranked)
@@ -0,0 +1,46 @@
+import zlib
+
+import httpx
+
+from page_cache import PageCache
+
+
+def page(url, body):
+    return httpx.Response(200, headers={"content-type": "text/html"}, content=body, request=httpx.Request("GET", url))
+
+
+def stored_size(cache):
+    return cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+
+def test_running_total_follows_replaced_pages(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"), max_bytes=10 ** 6)
+    cache.put("https://x.pl/a", page("https://x.pl/a", b"a" * 100))
+    cache.put("https://x.pl/b", page("https://x.pl/b", b"b" * 200))
+    cache.put("https://x.pl/a", page("https://x.pl/a", b"abc" * 1000))
+
+    assert cache._total == stored_size(cache)
+    assert cache.get("https://x.pl/a").body == b"abc" * 1000
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    bodies = {f"https://x.pl/{i}": bytes(range(256)) * (i + 1) for i in range(6)}
+    size = len(zlib.compress(bodies["https://x.pl/5"]))
+    cache = PageCache(str(tmp_path / "pages.sqlite"), max_bytes=3 * size)
+    for url, body in bodies.items():
+        cache.put(url, page(url, body))
+
+    assert cache.get("https://x.pl/0") is None
+    assert cache.get("https://x.pl/5") is not None
+    assert cache.stats["evicted"] > 0
+    assert cache._total == stored_size(cache) <= cache.max_bytes
+
+
+def test_total_is_read_from_an_existing_file(tmp_path):
+    path = str(tmp_path / "pages.sqlite")
+    cache = PageCache(path)
+    cache.put("https://x.pl/a", page("https://x.pl/a", b"a" * 100))
+    cache.close()
+
+    reopened = PageCache(path)
+    assert reopened._total == stored_size(reopened) > 0
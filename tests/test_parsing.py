@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("bs4")
+
+from parsing import decode_html, extract_main_text  # noqa: E402
+
+POLISH = "Zażółć gęślą jaźń, nasze usługi"
+
+
+def page(body, head=""):
+    return f"<html><head>{head}</head><body>{body}</body></html>"
+
+
+@pytest.mark.parametrize("content, encoding", [
+    # UTF-8 without <meta charset>, with and without the HTTP charset
+    (page(f"<p>{POLISH}</p>").encode("utf-8"), "utf-8"),
+    (page(f"<p>{POLISH}</p>").encode("utf-8"), None),
+    # Legacy Polish encoding, declared only in the page or only in the header
+    (page(f"<p>{POLISH}</p>", '<meta charset="iso-8859-2">').encode("iso-8859-2"), None),
+    (page(f"<p>{POLISH}</p>").encode("windows-1250"), "windows-1250"),
+    # A BOM beats a wrong header, an unknown charset falls back to detection
+    (b"\xef\xbb\xbf" + page(f"<p>{POLISH}</p>").encode("utf-8"), "iso-8859-1"),
+    (page(f"<p>{POLISH}</p>").encode("utf-8"), "x-unknown"),
+])
+def test_decode_html(content, encoding):
+    assert POLISH in decode_html(content, encoding)
+
+
+def test_truncated_multibyte_character_is_replaced():
+    content = f"<p>{POLISH}</p>".encode("utf-8")[:-6]
+
+    assert decode_html(content, "utf-8").startswith("<p>Zażółć")
+
+
+def test_extracted_text_keeps_polish_characters():
+    html = decode_html(('<?xml version="1.0" encoding="utf-8"?>' + page(f"<p>{POLISH}</p>")).encode("utf-8"))
+
+    assert POLISH in extract_main_text(html)
+
+
+def test_every_article_of_a_list_page_is_kept():
+    articles = "".join(f"<article><h2>Produkt {i}</h2><p>Opis produktu numer {i}.</p></article>" for i in range(8))
+    text = extract_main_text(page(f"<nav>menu</nav>{articles}<footer>stopka</footer>"))
+
+    assert "Produkt 0" in text and "Produkt 7" in text
+    assert "menu" not in text and "stopka" not in text
+
+
+def test_main_is_preferred_over_articles():
+    main = "<main>" + "Treść strony głównej. " * 20 + "</main>"
+    text = extract_main_text(page(main + "<article>" + "Inny wpis. " * 30 + "</article>"))
+
+    assert "Treść strony głównej" in text and "Inny wpis" not in text
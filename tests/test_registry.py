@@ -0,0 +1,170 @@
+"""Check digits, the memory-mapped registry index and verify_regon with a stand-in backend."""
+import asyncio
+import csv
+
+import pytest
+
+import registry
+from registry import (
+    LocalRegistry, RegistryEntry, RegistryIndex, build_index, find_identifiers, nip_is_valid,
+    regon_is_valid, verify_regon,
+)
+
+
+@pytest.mark.parametrize("regon, valid", [
+    ("123456785", True),
+    ("12-34-56-785", True),
+    ("12345678512347", True),
+    ("100000050", True),  # remainder 10 gives check digit 0
+    ("123456786", False),
+    ("000000000", False),
+    ("12345678", False),
+    (None, False),
+])
+def test_regon_is_valid(regon, valid):
+    assert regon_is_valid(regon) is valid
+
+
+@pytest.mark.parametrize("nip, valid", [
+    ("1234563218", True),
+    ("123-456-32-18", True),
+    ("5260250995", True),
+    ("1234563219", False),
+    ("1234563030", False),  # remainder 10 is never a valid NIP
+    ("123456321", False),
+    ("", False),
+])
+def test_nip_is_valid(nip, valid):
+    assert nip_is_valid(nip) is valid
+
+
+def test_find_identifiers_keeps_only_valid_numbers():
+    html = b"<footer>NIP: PL 123-456-32-18<br>REGON <b>123456785</b> NIP 1234563219</footer>"
+
+    assert find_identifiers(html) == {"nip": {"1234563218"}, "regon": {"123456785"}}
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    dump = tmp_path / "dump.csv"
+    with open(dump, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["regon", "nip", "name"])
+        writer.writerow(["123456785", "123-456-32-18", "Przykład Sp. z o.o."])
+        writer.writerow(["12345678512347", "", "Oddział Kraków"])
+        writer.writerow(["100000008", "1234563219", "Zły NIP S.A."])
+        writer.writerow(["123456786", "1234563218", "Zły REGON"])
+        # Sequential REGONs collide often enough to exercise linear probing
+        for regon in ("100000014", "100000020", "100000037", "100000050"):
+            writer.writerow([regon, "", f"Firma {regon}"])
+    path = tmp_path / "registry.idx"
+    assert build_index(dump, path) == 7
+    return path
+
+
+def test_index_round_trip(index_path):
+    index = RegistryIndex(index_path)
+    try:
+        assert index.get("123456785") == RegistryEntry("123456785", "1234563218", "Przykład Sp. z o.o.")
+        assert index.get("12345678512347") == RegistryEntry("12345678512347", None, "Oddział Kraków")
+        # An invalid NIP in the dump is not stored
+        assert index.get("100000008").nip is None
+        for regon in ("100000014", "100000020", "100000037", "100000050"):
+            assert index.get(regon).name == f"Firma {regon}"
+        # Rows with an invalid REGON are skipped, unknown REGONs are not found
+        assert index.get("123456786") is None
+        assert index.get("100000043") is None
+        assert index.record_count == 7
+    finally:
+        index.close()
+
+
+def test_index_rejects_other_files(tmp_path):
+    path = tmp_path / "not-an-index"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        RegistryIndex(path)
+
+
+class StubRegistry:
+    """Stand-in backend answering from a dict, recording the REGONs asked for."""
+
+    def __init__(self, entries=(), error=None):
+        self.entries = {entry.regon: entry for entry in entries}
+        self.error = error
+        self.lookups = []
+
+    async def lookup(self, regon):
+        self.lookups.append(regon)
+        if self.error is not None:
+            raise self.error
+        return self.entries.get(regon)
+
+
+def verify(regon, identifiers, backend):
+    return asyncio.run(verify_regon(regon, identifiers, backend))
+
+
+def test_verified_by_the_regon_on_the_site():
+    result = verify("123456785", {"regon": {"123456785"}, "nip": set()}, StubRegistry())
+
+    assert result["status"] == "verified"
+    assert result["registry"] == {"found": False}
+
+
+def test_local_unit_is_verified_by_its_company_regon():
+    result = verify("12345678512347", {"regon": {"123456785"}}, StubRegistry())
+
+    assert result["status"] == "verified"
+
+
+def test_verified_by_the_nip_the_registry_has():
+    backend = StubRegistry([RegistryEntry("123456785", "1234563218", "Przykład")])
+    result = verify("123456785", {"regon": set(), "nip": {"1234563218"}}, backend)
+
+    assert result["status"] == "verified"
+    assert result["registry"] == {"found": True, "nip": "1234563218", "name": "Przykład"}
+
+
+def test_local_unit_falls_back_to_the_company_entry():
+    backend = StubRegistry([RegistryEntry("123456785", "1234563218", "Przykład")])
+    result = verify("12345678512347", {"nip": {"1234563218"}}, backend)
+
+    assert backend.lookups == ["12345678512347", "123456785"]
+    assert result["status"] == "verified"
+
+
+def test_mismatch_when_the_site_shows_other_identifiers():
+    backend = StubRegistry([RegistryEntry("123456785", "1234563218", "Przykład")])
+    result = verify("123456785", {"regon": {"100000008"}, "nip": {"5260250995"}}, backend)
+
+    assert result["status"] == "mismatch"
+
+
+def test_unverified_without_identifiers_and_on_backend_errors():
+    result = verify("123456785", {}, StubRegistry(error=RuntimeError("registry down")))
+
+    assert result["status"] == "unverified"
+    assert result["registry_error"] == "RuntimeError: registry down"
+
+
+def test_invalid_regon_is_not_looked_up():
+    backend = StubRegistry()
+    result = verify("123456786", {"regon": {"123456786"}}, backend)
+
+    assert result["status"] == "invalid"
+    assert backend.lookups == []
+
+
+def test_use_registry_installs_the_default_backend(index_path, monkeypatch):
+    monkeypatch.setattr(registry, "_registry", None)
+    monkeypatch.setattr(registry, "_registry_loaded", False)
+    local = LocalRegistry(index_path)
+    registry.use_registry(local)
+    try:
+        assert registry.get_registry() is local
+        result = verify("123456785", {"nip": {"1234563218"}}, None)
+        assert result["status"] == "verified"
+        assert result["registry"]["name"] == "Przykład Sp. z o.o."
+    finally:
+        local.index.close()
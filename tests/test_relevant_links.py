@@ -0,0 +1,93 @@
+"""Link ranking through ChatOpenAI against a local fake of the chat completions endpoint."""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+import main  # noqa: E402
+
+URLS = ["https://x.pl/kontakt", "https://x.pl/o-nas", "https://x.pl/oferta", "https://x.pl/blog"]
+
+
+class FakeOpenAI:
+    """Answers chat completions with the queued messages, recording each request body."""
+
+    def __init__(self):
+        self.requests = []
+        self.replies = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                fake.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                message = fake.replies.pop(0)
+                body = json.dumps({
+                    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": main.MODEL_NAME,
+                    "choices": [{"index": 0, "message": {"role": "assistant", **message}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    fake = FakeOpenAI()
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(
+        model_name=main.MODEL_NAME, temperature=0, max_retries=0, api_key="test",
+        base_url=f"http://127.0.0.1:{fake.server.server_port}/v1",
+    )
+    main.use_llm(llm)
+    yield fake
+    main.use_llm(None)
+    fake.server.shutdown()
+
+
+def test_structured_output_picks_links_by_number(fake_openai, monkeypatch):
+    monkeypatch.setattr(main, "RELEVANT_LINKS_STRUCTURED", True)
+    main.get_relevant_links_chain.__wrapped__.cache_clear()
+    # Sorted: blog, kontakt, o-nas, oferta
+    fake_openai.replies.append({"content": json.dumps({"links": [3, 4, 99]})})
+
+    chosen = asyncio.run(main.get_relevant_links(URLS))
+
+    assert chosen == ["https://x.pl/o-nas", "https://x.pl/oferta"]
+    response_format = fake_openai.requests[0]["response_format"]
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["schema"]["properties"]["links"]["type"] == "array"
+
+
+def test_unusable_structured_reply_falls_back_to_the_ranking_order(fake_openai, monkeypatch):
+    monkeypatch.setattr(main, "RELEVANT_LINKS_STRUCTURED", True)
+    main.get_relevant_links_chain.__wrapped__.cache_clear()
+    fake_openai.replies.append({"content": "Nie wiem."})
+
+    chosen = asyncio.run(main.get_relevant_links(URLS))
+
+    assert chosen == URLS[:3]
+
+
+def test_text_output_is_parsed(fake_openai, monkeypatch):
+    monkeypatch.setattr(main, "RELEVANT_LINKS_STRUCTURED", False)
+    main.get_relevant_links_chain.__wrapped__.cache_clear()
+    fake_openai.replies.append({"content": '{"links": [2]}'})
+
+    chosen = asyncio.run(main.get_relevant_links(URLS))
+
+    assert chosen == ["https://x.pl/kontakt"]
+    assert "response_format" not in fake_openai.requests[0]
@@ -0,0 +1,109 @@
+"""SheetsWriter against a local fake of the Sheets values:batchUpdate endpoint."""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import sheets
+
+
+class FakeSheets:
+    """Records batchUpdate bodies and answers with the queued statuses (then 200)."""
+
+    def __init__(self):
+        self.bodies = []
+        self.statuses = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                fake.bodies.append(json.loads(body))
+                status = fake.statuses.pop(0) if fake.statuses else 200
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v4"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def ranges(self, index=-1):
+        return [(item["range"], item["values"]) for item in self.bodies[index]["data"]]
+
+
+@pytest.fixture
+def fake_sheets(monkeypatch):
+    monkeypatch.setattr(sheets, "SHEETS_BACKOFF_BASE", 0)
+    monkeypatch.setattr(sheets, "SHEETS_MAX_RETRIES", 1)
+    fake = FakeSheets()
+    yield fake
+    fake.server.shutdown()
+
+
+def run_writer(fake, rows, flush_rows=200, statuses=()):
+    async def main():
+        fake.statuses.extend(statuses)
+        writer = sheets.SheetsWriter(
+            spreadsheet_id="sheet", base_url=fake.url, flush_rows=flush_rows,
+            flush_interval=60, writes_per_minute=6000,
+        )
+        for row, description in rows:
+            writer.add(row, {"description": description})
+        written = await writer.flush()
+        pending = dict(writer._pending)
+        await writer._client.aclose()
+        return written, pending, writer.stats
+
+    return asyncio.run(main())
+
+
+def test_adjacent_rows_are_merged_into_one_range(fake_sheets):
+    written, pending, stats = run_writer(fake_sheets, [(3, "c"), (2, "b"), (7, "g"), ("4", "d")])
+
+    assert written and not pending
+    assert len(fake_sheets.bodies) == 1
+    assert fake_sheets.ranges() == [
+        ("'Arkusz1'!D2:D4", [["b"], ["c"], ["d"]]),
+        ("'Arkusz1'!D7:D7", [["g"]]),
+    ]
+    assert stats["written_rows"] == 4
+
+
+def test_batches_hold_at_most_flush_rows_rows(fake_sheets):
+    written, _, stats = run_writer(fake_sheets, [(row, str(row)) for row in range(2, 7)], flush_rows=2)
+
+    assert written
+    assert [fake_sheets.ranges(i)[0][0] for i in range(3)] == [
+        "'Arkusz1'!D2:D3", "'Arkusz1'!D4:D5", "'Arkusz1'!D6:D6",
+    ]
+    assert stats["requests"] == 3
+
+
+def test_batch_is_requeued_when_retries_run_out(fake_sheets):
+    written, pending, stats = run_writer(fake_sheets, [(2, "b"), (3, "c")], statuses=[503, 503])
+
+    assert not written
+    assert pending == {2: {"description": "b"}, 3: {"description": "c"}}
+    assert stats["retries"] == 1
+    assert len(fake_sheets.bodies) == 2
+
+
+def test_retry_succeeds_after_a_transient_error(fake_sheets):
+    written, pending, stats = run_writer(fake_sheets, [(2, "b")], statuses=[429])
+
+    assert written and not pending
+    assert stats["retries"] == 1 and stats["written_rows"] == 1
+
+
+def test_non_retryable_error_drops_the_batch(fake_sheets):
+    written, pending, stats = run_writer(fake_sheets, [(2, "b")], statuses=[400])
+
+    assert written and not pending
+    assert stats["failed_batches"] == 1 and stats["written_rows"] == 0
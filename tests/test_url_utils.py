@@ -0,0 +1,79 @@
+import pytest
+
+from url_utils import canonicalize_url, collapse_language_variants, is_same_site, page_key, url_language
+
+
+@pytest.mark.parametrize("url, canonical", [
+    ("HTTPS://Example.PL:443/o-nas/#zespol", "https://example.pl/o-nas"),
+    ("http://example.pl:8080//a/./b/../c/", "http://example.pl:8080/a/c"),
+    ("https://example.pl/index.php", "https://example.pl/"),
+    ("https://example.pl/oferta?utm_source=x&b=2&a=1&fbclid=y", "https://example.pl/oferta?a=1&b=2"),
+    # www is kept, the bare host may not serve the site
+    ("https://www.example.pl/o-nas/", "https://www.example.pl/o-nas"),
+])
+def test_canonicalize_url(url, canonical):
+    assert canonicalize_url(url) == canonical
+
+
+@pytest.mark.parametrize("url", ["http://x.pl:abc/", "http://[::1/"])
+def test_malformed_urls_raise_value_error(url):
+    with pytest.raises(ValueError):
+        canonicalize_url(url)
+
+
+@pytest.mark.parametrize("a, b, same", [
+    ("https://x.pl/o-nas", "https://www.x.pl/o-nas/", True),
+    ("http://x.pl/o-nas", "https://x.pl/o-nas#top", True),
+    ("https://x.pl/o-nas?utm_source=x", "https://X.pl/o-nas", True),
+    ("https://x.pl/o-nas", "https://x.pl/oferta", False),
+    ("https://x.pl:8443/o-nas", "https://x.pl/o-nas", False),
+    ("https://sklep.x.pl/o-nas", "https://x.pl/o-nas", False),
+])
+def test_page_key_merges_scheme_and_www_variants(a, b, same):
+    assert (page_key(a) == page_key(b)) is same
+
+
+@pytest.mark.parametrize("url, same", [
+    ("https://www.x.pl/a", True),
+    ("http://sklep.x.pl/a", True),
+    ("https://x.pl.evil.com/a", False),
+    ("https://notx.pl/a", False),
+    ("mailto:biuro@x.pl", False),
+])
+def test_is_same_site(url, same):
+    assert is_same_site(url, "https://x.pl/") is same
+
+
+@pytest.mark.parametrize("url, hreflang, language", [
+    ("https://x.pl/en/about", None, "en"),
+    ("https://x.pl/pl-pl/o-nas", None, "pl"),
+    ("https://x.pl/wp/o-nas", None, None),
+    ("https://x.pl/o-nas", None, None),
+    ("https://x.pl/o-nas", "de_DE", "de"),
+])
+def test_url_language(url, hreflang, language):
+    assert url_language(url, hreflang) == language
+
+
+def test_polish_version_is_kept():
+    links = {url: {} for url in (
+        "https://x.pl/pl/o-nas", "https://x.pl/pl/oferta", "https://x.pl/pl/kontakt",
+        "https://x.pl/en/about", "https://x.pl/en/offer", "https://x.pl/en/contact", "https://x.pl/en/news",
+        "https://x.pl/regulamin",
+    )}
+
+    assert sorted(collapse_language_variants(links)) == [
+        "https://x.pl/pl/kontakt", "https://x.pl/pl/o-nas", "https://x.pl/pl/oferta", "https://x.pl/regulamin",
+    ]
+
+
+def test_largest_language_wins_when_polish_is_incomplete():
+    links = {url: {} for url in ("https://x.pl/pl/o-nas", "https://x.pl/en/about", "https://x.pl/en/offer")}
+
+    assert sorted(collapse_language_variants(links)) == ["https://x.pl/en/about", "https://x.pl/en/offer"]
+
+
+def test_single_language_site_is_untouched():
+    links = {"https://x.pl/en/about": {}, "https://x.pl/o-nas": {"lang": None}}
+
+    assert collapse_language_variants(links) == links
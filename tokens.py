@@ -0,0 +1,87 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken ships with langchain_openai
+    tiktoken = None
+
+
+# Rough characters per token, used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_name):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text, model_name):
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model_name):
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def split_into_chunks(text, chunk_tokens, model_name):
+    """Split text into pieces of at most chunk_tokens tokens."""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        size = chunk_tokens * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + chunk_tokens]) for i in range(0, len(tokens), chunk_tokens)]
+
+
+def allocate_budget(pages, budget, model_name, min_tokens=200, decay=0.5):
+    """Fit {url: text} into `budget` tokens, favouring earlier (more relevant) pages.
+
+    Pages are given weighted shares of the budget (weight 1 / (1 + decay * rank)).
+    Pages shorter than their share keep all their text and the unused tokens
+    go to the others. Pages that would get less than `min_tokens` are dropped,
+    least relevant first. Returns a new {url: text} in the same order.
+    """
+    sizes = {url: count_tokens(text, model_name) for url, text in pages.items()}
+    if sum(sizes.values()) <= budget:
+        return dict(pages)
+
+    urls = list(pages)
+    while urls:
+        weights = {url: 1.0 / (1.0 + decay * rank) for rank, url in enumerate(urls)}
+        shares = {}
+        remaining = budget
+        open_urls = list(urls)
+        # Water-filling: settle pages that fit in their share, then split what is left
+        while open_urls:
+            total_weight = sum(weights[url] for url in open_urls)
+            fitting = [url for url in open_urls if sizes[url] <= remaining * weights[url] / total_weight]
+            if not fitting:
+                for url in open_urls:
+                    shares[url] = int(remaining * weights[url] / total_weight)
+                break
+            for url in fitting:
+                shares[url] = sizes[url]
+                remaining -= sizes[url]
+                open_urls.remove(url)
+        if all(shares[url] >= min(min_tokens, sizes[url]) for url in urls):
+            break
+        # Not enough room for every page, drop the least relevant one and retry
+        urls.pop()
+
+    return {url: truncate_to_tokens(pages[url], shares[url], model_name) for url in urls}
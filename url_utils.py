@@ -0,0 +1,117 @@
+import os
+import posixpath
+import re
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# Language kept when a site links to several language versions of itself
+PREFERRED_LANGUAGE = os.getenv("PREFERRED_LANGUAGE", "pl")
+
+# Query parameters that only track the visit and never change the page
+TRACKING_PARAMS = {
+    'gclid', 'fbclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl',
+    'ref', 'source', 'sessionid', 'phpsessid', 'sid',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+INDEX_PAGES = {'index.html', 'index.htm', 'index.php', 'default.aspx'}
+
+_language_pattern = re.compile(r'^[a-z]{2}(?:[-_][a-z]{2})?$')
+# Two letter path segments which are not language codes
+NOT_LANGUAGES = {'wp', 'js', 'id', 'ad', 'go', 'my', 'ui'}
+
+
+def canonicalize_url(url):
+    """Normalize a URL so variants of the same page compare equal.
+
+    Drops the fragment and tracking parameters, lowercases scheme and host,
+    removes default ports, dot segments, duplicate and trailing slashes and
+    index pages, and sorts the remaining query parameters. The www prefix
+    is kept, the other host may not serve the site (see page_key).
+    Raises ValueError for a malformed URL, e.g. a non-numeric port.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    port = parts.port if parts.port is not None else None
+    netloc = host
+    if port is not None and str(port) != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+
+    path = re.sub(r'/{2,}', '/', parts.path or '/')
+    path = posixpath.normpath(path) if path != '/' else path
+    if path.startswith('//'):
+        path = '/' + path.lstrip('/')
+    if posixpath.basename(path).lower() in INDEX_PAGES:
+        path = posixpath.dirname(path)
+    if path in ('', '.'):
+        path = '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ''))
+
+
+def page_key(url):
+    """Key under which http/https and www/non-www variants of a page compare equal."""
+    parts = urlsplit(canonicalize_url(url))
+    host = parts.netloc[4:] if parts.netloc.startswith('www.') else parts.netloc
+    return urlunsplit(('', host, parts.path, parts.query, ''))
+
+
+def site_host(url):
+    host = (urlsplit(url).hostname or '').rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+
+def is_same_site(url, base_url):
+    """True for links on the base host or one of its subdomains (www is ignored)."""
+    if urlsplit(url).scheme not in ('http', 'https'):
+        return False
+    host, base = site_host(url), site_host(base_url)
+    return host == base or host.endswith('.' + base)
+
+
+def url_language(url, hreflang=None):
+    """Language of a link from its hreflang or its first path segment, or None."""
+    if hreflang:
+        return hreflang.lower().replace('_', '-').split('-')[0]
+    segments = [s for s in urlsplit(url).path.lower().split('/') if s]
+    if segments and _language_pattern.match(segments[0]) and segments[0] not in NOT_LANGUAGES:
+        return segments[0][:2]
+    return None
+
+
+def choose_language(languages, preferred=PREFERRED_LANGUAGE):
+    """Pick the language tree to keep from a Counter of link languages.
+
+    The preferred language wins when its tree is reasonably complete,
+    otherwise the language with the most links does.
+    """
+    if not languages:
+        return None
+    largest_language, largest = languages.most_common(1)[0]
+    if languages.get(preferred, 0) >= max(3, largest / 2):
+        return preferred
+    return largest_language
+
+
+def collapse_language_variants(links, preferred=PREFERRED_LANGUAGE):
+    """Keep one language version of a multilingual site.
+
+    `links` is a {url: info} dict; an optional info["lang"] holds the
+    anchor's hreflang. Links without a language are always kept.
+    """
+    languages = {url: url_language(url, info.get("lang")) for url, info in links.items()}
+    counts = Counter(lang for lang in languages.values() if lang)
+    if len(counts) < 2:
+        return links
+    keep = choose_language(counts, preferred)
+    return {url: info for url, info in links.items() if languages[url] in (None, keep)}